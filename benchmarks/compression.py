@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Compare the output size and startup time of bundles using each payload format.
+
+Usage: python benchmarks/compression.py [--modules N] [--imported N] [--runs N]
+"""
+
+import argparse
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import stickytape
+
+from synthetic import generate_tree
+
+
+_formats = [
+    ("tempdir", dict(import_mode="tempdir")),
+    ("memory", dict(import_mode="memory")),
+    ("lazy", dict(import_mode="lazy")),
+    ("lazy+zlib", dict(import_mode="lazy", compression="zlib")),
+    ("lazy+lzma", dict(import_mode="lazy", compression="lzma")),
+]
+
+
+def main():
+    args = _parse_args()
+    root = tempfile.mkdtemp()
+    try:
+        source_path = os.path.join(root, "src")
+        os.mkdir(source_path)
+        script_path = generate_tree(
+            source_path,
+            modules=args.modules,
+            depth=1,
+            package_depth=0,
+            imported=args.imported,
+        )
+        print("{0:<12} {1:>12} {2:>14}".format("format", "size (bytes)", "startup (ms)"))
+        for name, kwargs in _formats:
+            output = stickytape.script(script_path, **kwargs)
+            output_path = os.path.join(root, "bundle-" + name)
+            with open(output_path, "w", encoding="utf-8") as output_file:
+                output_file.write(output)
+            startup = _median_startup_time(output_path, runs=args.runs)
+            print("{0:<12} {1:>12} {2:>14.1f}".format(name, len(output.encode("utf-8")), startup * 1000))
+    finally:
+        shutil.rmtree(root)
+
+
+def _median_startup_time(path, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, path], check=True)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=500)
+    parser.add_argument("--imported", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=11)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
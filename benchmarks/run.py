@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+"""
+Measure bundling and startup performance on a synthetic dependency tree.
+
+For each bundle configuration, records the wall time and peak memory of
+bundling, the size of the output, and the startup time of the output,
+measured by running the output in a new interpreter. Results are written
+as JSON, and can be compared against the results from another commit:
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --compare before.json
+"""
+
+import argparse
+import json
+import os.path
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import stickytape
+
+from synthetic import generate_tree
+
+
+_configurations = [
+    ("tempdir", stickytape.script, dict(import_mode="tempdir")),
+    ("memory", stickytape.script, dict(import_mode="memory")),
+    ("lazy", stickytape.script, dict(import_mode="lazy")),
+    ("lazy+zlib", stickytape.script, dict(import_mode="lazy", compression="zlib")),
+    ("lazy+precompile", stickytape.script, dict(import_mode="lazy", precompile=True)),
+    ("zipapp", stickytape.zipapp, dict()),
+    ("zipapp+precompile", stickytape.zipapp, dict(precompile=True)),
+]
+
+# Metrics where a larger value is worse
+_metrics = ["bundle_time", "bundle_peak_memory", "output_size", "startup_time"]
+
+
+def main():
+    args = _parse_args()
+    parameters = dict(
+        modules=args.modules,
+        depth=args.depth,
+        fan_out=args.fan_out,
+        package_depth=args.package_depth,
+        package_fan_out=args.package_fan_out,
+        module_size=args.module_size,
+    )
+
+    root = tempfile.mkdtemp()
+    try:
+        source_path = os.path.join(root, "src")
+        os.mkdir(source_path)
+        script_path = generate_tree(source_path, **parameters)
+        results = dict(
+            (name, _measure(bundle, script_path, kwargs, output_path=os.path.join(root, name), runs=args.runs))
+            for name, bundle, kwargs in _configurations
+        )
+    finally:
+        shutil.rmtree(root)
+
+    report = dict(
+        metadata=dict(
+            commit=_git_commit(),
+            python=sys.version,
+            platform=platform.platform(),
+            parameters=parameters,
+            runs=args.runs,
+        ),
+        results=results,
+    )
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=4, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = _compare(baseline, report, threshold=args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+def _measure(bundle, script_path, kwargs, output_path, runs):
+    bundle_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = bundle(script_path, **kwargs)
+        bundle_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        bundle(script_path, **kwargs)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    if isinstance(output, str):
+        output = output.encode("utf-8")
+    with open(output_path, "wb") as output_file:
+        output_file.write(output)
+
+    startup_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, output_path], check=True)
+        startup_times.append(time.perf_counter() - start)
+
+    return dict(
+        bundle_time=_median(bundle_times),
+        bundle_peak_memory=peak_memory,
+        output_size=len(output),
+        startup_time=_median(startup_times),
+    )
+
+
+def _compare(baseline, report, threshold):
+    regressions = []
+    print("{0:<20} {1:<20} {2:>14} {3:>14} {4:>8}".format("configuration", "metric", "baseline", "current", "change"), file=sys.stderr)
+    for name, result in sorted(report["results"].items()):
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            continue
+        for metric in _metrics:
+            before = baseline_result[metric]
+            after = result[metric]
+            change = (after - before) / before if before else 0
+            regressed = change > threshold
+            if regressed:
+                regressions.append((name, metric))
+            print("{0:<20} {1:<20} {2:>14.4g} {3:>14.4g} {4:>+7.1%}{5}".format(
+                name, metric, before, after, change, " !" if regressed else "",
+            ), file=sys.stderr)
+    return regressions
+
+
+def _median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--fan-out", type=int, default=3)
+    parser.add_argument("--package-depth", type=int, default=2)
+    parser.add_argument("--package-fan-out", type=int, default=3)
+    parser.add_argument("--module-size", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import os.path
+
+
+def generate_tree(root, modules=100, depth=5, fan_out=3, package_depth=2, package_fan_out=3, module_size=2000, imported=None):
+    # Generates a package named "bench" containing the given number of
+    # modules. The modules are split into depth levels, so that the longest
+    # chain of imports is depth modules long, and each module imports up to
+    # fan_out modules from the next level. Modules are nested in packages
+    # package_depth levels deep, with up to package_fan_out packages in each
+    # package. Returns the path of a script that imports the modules in the
+    # first level, so that every module is reachable from the script. When
+    # imported is set, the script only imports that many of those modules
+    # when it's run, although every module is still bundled.
+    levels = _split_into_levels(modules, depth)
+    for level_index, level in enumerate(levels):
+        if level_index + 1 < len(levels):
+            next_level = levels[level_index + 1]
+        else:
+            next_level = []
+
+        for position, index in enumerate(level):
+            children = sorted(set(
+                next_level[(position + offset) % len(next_level)]
+                for offset in range(min(fan_out, len(next_level)))
+            ))
+            module_path = os.path.join(root, *_module_name(index, package_depth, package_fan_out).split(".")) + ".py"
+            _ensure_package(root, os.path.dirname(module_path))
+            with open(module_path, "w", encoding="utf-8") as module_file:
+                module_file.write(_module_source(
+                    index,
+                    imports=[_module_name(child, package_depth, package_fan_out) for child in children],
+                    size=module_size,
+                ))
+
+    script_path = os.path.join(root, "main")
+    with open(script_path, "w", encoding="utf-8") as script_file:
+        for position, index in enumerate(levels[0] if levels else []):
+            # Every module is referenced statically so that it's bundled
+            is_imported = imported is None or position < imported
+            script_file.write("if {0}:\n    import {1}\n".format(is_imported, _module_name(index, package_depth, package_fan_out)))
+    return script_path
+
+
+def _split_into_levels(modules, depth):
+    # Earlier levels are never smaller than later levels, so that importing
+    # the modules at each position in one level reaches every module in the
+    # next.
+    depth = max(1, min(depth, modules))
+    levels = []
+    start = 0
+    for level_index in range(depth):
+        size = modules // depth + (1 if level_index < modules % depth else 0)
+        levels.append(list(range(start, start + size)))
+        start += size
+    return [level for level in levels if level]
+
+
+def _module_name(index, package_depth, package_fan_out):
+    packages = [
+        "p{0}".format((index // (package_fan_out ** level)) % package_fan_out)
+        for level in range(package_depth)
+    ]
+    return ".".join(["bench"] + packages + ["module_{0}".format(index)])
+
+
+def _ensure_package(root, path):
+    while path != root and not os.path.exists(os.path.join(path, "__init__.py")):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "__init__.py"), "w") as init_file:
+            init_file.write("\n")
+        path = os.path.dirname(path)
+
+
+def _module_source(index, imports, size):
+    lines = ['"""Module {0}: données, Größe, サイズ."""'.format(index), ""]
+    lines += ["import " + name for name in imports]
+    lines.append("")
+
+    function_index = 0
+    while sum(len(line) + 1 for line in lines) < size:
+        lines.append("def function_{0}(value):".format(function_index))
+        lines.append("    # Multiply the value by a constant (Konstante).")
+        lines.append("    return value * {0} + {1}".format(function_index, index))
+        lines.append("")
+        function_index += 1
+
+    return "\n".join(lines)
@@ -1,7 +1,26 @@
 import ast
+import base64
+import collections
+import concurrent.futures
+import glob
+import hashlib
+import io
+import json
 import os.path
-import subprocess
+import shutil
+import struct
+import threading
+import time
+import zipfile
 
+from .blob_store import BlobStore, content_hash_of
+from .bytecode import compile_modules
+from .cache import DependencyCache, InterpreterCache, evict_cache
+from .guards import StaticGuards
+from .interpreter import read_interpreter_info
+from .minify import Minifier
+from .options import BundleOptions
+from .polling import PollingWatcher
 from .stdlib import is_stdlib_module
 
 
@@ -11,41 +30,673 @@ def script(
     add_python_paths=None,
     python_binary=None,
     copy_shebang=False,
+    *,
+    options=None,
+    tree_shaking_report=None,
+    report=None,
+    **kwargs
 ):
-    if add_python_modules is None:
-        add_python_modules = []
+    output = io.StringIO()
+    script_to_file(
+        path,
+        output,
+        add_python_modules,
+        add_python_paths,
+        python_binary,
+        copy_shebang,
+        options=options,
+        tree_shaking_report=tree_shaking_report,
+        report=report,
+        **kwargs
+    )
+    return output.getvalue()
+
+def script_to_file(
+    path,
+    output_file,
+    add_python_modules=None,
+    add_python_paths=None,
+    python_binary=None,
+    copy_shebang=False,
+    *,
+    options=None,
+    tree_shaking_report=None,
+    report=None,
+    **kwargs
+):
+    # Writes the output script to the text file output_file, reading each
+    # bundled module as it is written, rather than holding the whole output
+    # in memory.
+    options = _bundle_options(options, "script", add_python_modules, add_python_paths, python_binary, copy_shebang, kwargs)
+    with _Analysis(options) as analysis:
+        _write_script(path, output_file, analysis=analysis, tree_shaking_report=tree_shaking_report, report=report)
+
+def zipapp(
+    path,
+    add_python_modules=None,
+    add_python_paths=None,
+    python_binary=None,
+    copy_shebang=False,
+    *,
+    options=None,
+    tree_shaking_report=None,
+    report=None,
+    **kwargs
+):
+    output = io.BytesIO()
+    zipapp_to_file(
+        path,
+        output,
+        add_python_modules,
+        add_python_paths,
+        python_binary,
+        copy_shebang,
+        options=options,
+        tree_shaking_report=tree_shaking_report,
+        report=report,
+        **kwargs
+    )
+    return output.getvalue()
+
+def zipapp_to_file(
+    path,
+    output_file,
+    add_python_modules=None,
+    add_python_paths=None,
+    python_binary=None,
+    copy_shebang=False,
+    *,
+    options=None,
+    tree_shaking_report=None,
+    report=None,
+    **kwargs
+):
+    # Writes the zip app to the binary file output_file, which must be
+    # seekable.
+    options = _bundle_options(options, "zipapp", add_python_modules, add_python_paths, python_binary, copy_shebang, kwargs)
+    with _Analysis(options) as analysis:
+        _write_zipapp(path, output_file, analysis=analysis, tree_shaking_report=tree_shaking_report, report=report)
 
-    if add_python_paths is None:
-        add_python_paths = []
+def scripts(
+    paths,
+    output_dir,
+    output_format="script",
+    add_python_modules=None,
+    add_python_paths=None,
+    python_binary=None,
+    copy_shebang=False,
+    *,
+    options=None,
+    tree_shaking_report=None,
+    report=None,
+    **kwargs
+):
+    # Bundles each script into output_dir, sharing the analysis of modules
+    # that more than one script depends on. When blob_store is set, the
+    # contents of bundled files are shared between scripts by writing them
+    # to that directory. When jobs is more than one, that many scripts are
+    # written at the same time.
+    options = _bundle_options(options, output_format, add_python_modules, add_python_paths, python_binary, copy_shebang, kwargs)
+
+    output_paths = [
+        os.path.join(output_dir, os.path.basename(path))
+        for path in paths
+    ]
+    if len(set(output_paths)) != len(output_paths):
+        raise ValueError("Scripts must have distinct filenames")
+
+    with _Analysis(options) as analysis:
+        def bundle(path, output_path):
+            # Each script has its own reports, which are combined in the order
+            # of paths, so that reports don't depend on which script is
+            # written first.
+            script_tree_shaking_report = None if tree_shaking_report is None else TreeShakingReport()
+            script_report = None if report is None else BundleReport()
+            _write_to_path(
+                output_format,
+                path,
+                output_path,
+                analysis=analysis,
+                tree_shaking_report=script_tree_shaking_report,
+                report=script_report,
+            )
+            return script_tree_shaking_report, script_report
 
-    python_paths = [os.path.dirname(path)] + add_python_paths + _read_sys_path_from_python_bin(python_binary)
+        if options.jobs > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=options.jobs) as executor:
+                script_reports = list(executor.map(bundle, paths, output_paths))
+        else:
+            script_reports = list(map(bundle, paths, output_paths))
+
+    for script_tree_shaking_report, script_report in script_reports:
+        if tree_shaking_report is not None:
+            tree_shaking_report.extend(script_tree_shaking_report)
+        if report is not None:
+            report.extend(script_report)
+
+    return output_paths
+
+def _bundle_options(options, output_format, add_python_modules, add_python_paths, python_binary, copy_shebang, kwargs):
+    # Options are either passed as a BundleOptions, or as arguments that are
+    # used to create one.
+    if options is None:
+        options = BundleOptions(
+            add_python_modules=add_python_modules,
+            add_python_paths=add_python_paths,
+            python_binary=python_binary,
+            copy_shebang=copy_shebang,
+            **kwargs
+        )
+    elif kwargs or add_python_modules is not None or add_python_paths is not None or python_binary is not None or copy_shebang:
+        raise TypeError("Options can't be passed both as a BundleOptions and as arguments")
 
-    output = []
+    options.validate(output_format)
+    return options
 
-    output.append(_generate_shebang(path, copy=copy_shebang))
-    output.append(_prelude())
-    output.append(_generate_module_writers(
+def _write_to_path(output_format, path, output_path, analysis, tree_shaking_report, report):
+    if output_format == "zipapp":
+        with open(output_path, "wb") as output_file:
+            return _write_zipapp(path, output_file, analysis=analysis, tree_shaking_report=tree_shaking_report, report=report)
+    else:
+        with open(output_path, "w", encoding="utf-8") as output_file:
+            return _write_script(path, output_file, analysis=analysis, tree_shaking_report=tree_shaking_report, report=report)
+
+class BundleWatcher(object):
+    # Bundles a script to output_path, and bundles it again whenever a bundled
+    # file, or a directory that was searched for modules, changes. The imports
+    # found in unchanged modules are kept in memory, so only changed modules
+    # are parsed again.
+    def __init__(
+        self,
         path,
-        sys_path=python_paths,
-        add_python_modules=add_python_modules,
-    ))
+        output_path,
+        output_format="script",
+        add_python_modules=None,
+        add_python_paths=None,
+        python_binary=None,
+        copy_shebang=False,
+        *,
+        options=None,
+        **kwargs
+    ):
+        self._path = path
+        self._output_path = output_path
+        self._output_format = output_format
+        self._analysis = _Analysis(_bundle_options(
+            options,
+            output_format,
+            add_python_modules,
+            add_python_paths,
+            python_binary,
+            copy_shebang,
+            kwargs,
+        ))
+        self._watcher = PollingWatcher()
+
+    def __enter__(self):
+        self._analysis.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._analysis.__exit__(*args)
+
+    def build(self):
+        # The output is replaced once it has been written, so that a failed
+        # build leaves the previous output in place.
+        temp_path = self._output_path + ".stickytape-tmp"
+        try:
+            generator = _write_to_path(
+                self._output_format,
+                self._path,
+                temp_path,
+                analysis=self._analysis,
+                tree_shaking_report=None,
+                report=None,
+            )
+            if os.path.exists(self._output_path):
+                shutil.copymode(self._output_path, temp_path)
+            os.replace(temp_path, self._output_path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # Directories of bundled files are watched so that new data files
+        # matching a pattern are found.
+        source_paths = [self._path] + generator.source_paths()
+        self._watcher.watch(
+            source_paths +
+            [os.path.dirname(source_path) for source_path in source_paths] +
+            self._analysis.searched_directories()
+        )
+
+    def rebuild_if_changed(self):
+        # Returns the paths that changed
+        changed_paths = self._watcher.changed_paths()
+        if changed_paths:
+            self._analysis.invalidate(changed_paths)
+            try:
+                self.build()
+            except:
+                # If the build fails, such as when a module has a syntax
+                # error, don't try again until there's another change.
+                self._watcher.refresh()
+                raise
+        return changed_paths
+
+def _write_script(path, output_file, analysis, tree_shaking_report, report):
+    options = analysis.options
+    import_mode = options.import_mode
+    prelude = _prelude(import_mode)
+    generator = analysis.generate_modules(path, tree_shaking_report=tree_shaking_report)
+
+    if options.deterministic:
+        manifest_file = output_file
+        output_file = _HashingWriter(output_file)
+
+    output_file.write(_generate_shebang(path, copy=options.copy_shebang))
+    output_file.write(prelude)
+    if options.blob_store is not None:
+        generator.write_to_blob_store(output_file, BlobStore(options.blob_store))
+    elif import_mode == "lazy":
+        generator.write_index(output_file, compression=options.compression)
+    elif import_mode == "cache":
+        output_file.write("    __stickytape_cache.open({0})\n".format(repr(generator.content_hash())))
+        generator.write(output_file)
+        output_file.write("    __stickytape_cache.finish()\n")
+    else:
+        generator.write(output_file, compress_data=import_mode == "memory")
+    if import_mode in ("memory", "lazy"):
+        generator.write_extension_index(output_file)
     with _open_source_file(path) as source_file:
-        output.append(_indent(source_file.read()))
-    return "".join(output)
+        output_file.write(_indent(source_file.read()))
 
-def _read_sys_path_from_python_bin(binary_path):
-    if binary_path is None:
-        return []
+    if options.deterministic:
+        # The manifest is a comment at the end of the output, so that the
+        # content hash can cover everything before it.
+        manifest_file.write("\n" + _script_manifest_prefix + _manifest_json(
+            content_hash=output_file.hexdigest(),
+            script_hash=content_hash_of(_read_binary(path)),
+            file_hashes=generator.file_hashes(),
+        ) + "\n")
+
+    if report is not None:
+        report.add(path, generator)
+
+    return generator
+
+def _write_zipapp(path, output_file, analysis, tree_shaking_report, report):
+    options = analysis.options
+    compression = options.compression
+    if compression is None:
+        zip_compression = zipfile.ZIP_STORED
     else:
-        output = subprocess.check_output(
-            [binary_path, "-E", "-c", "import sys;\nfor path in sys.path: print(path)"],
+        zip_compression = zipfile.ZIP_DEFLATED
+
+    generator = analysis.generate_modules(path, tree_shaking_report=tree_shaking_report)
+
+    shebang = _generate_shebang(path, copy=options.copy_shebang).rstrip("\n") + "\n"
+    output_file.write(shebang.encode("utf-8"))
+    with zipfile.ZipFile(output_file, "w", compression=zip_compression) as zip_file:
+        generator.write_zip(zip_file)
+        script = _read_binary(path)
+        _write_zip_entry(zip_file, "__main__.py", script)
+
+        if options.deterministic:
+            # The content hash covers the shebang, how entries are compressed,
+            # and the contents of every other entry.
+            file_hashes = generator.file_hashes()
+            content_hash = hashlib.sha256(_content_hash_version)
+            _update_content_hash(content_hash, "shebang", shebang.encode("utf-8"))
+            _update_content_hash(content_hash, "compression", repr(compression).encode("utf-8"))
+            _update_content_hash(content_hash, "__main__.py", script)
+            for file_path, file_hash in sorted(file_hashes.items()):
+                _update_content_hash(content_hash, file_path, file_hash.encode("ascii"))
+            manifest = _manifest_json(
+                content_hash=content_hash.hexdigest(),
+                script_hash=content_hash_of(script),
+                file_hashes=file_hashes,
+            )
+            _write_zip_entry(zip_file, _zip_manifest_name, manifest.encode("utf-8"))
+
+    if report is not None:
+        report.add(path, generator)
+
+    return generator
+
+def read_manifest(path):
+    # Reads the manifest of an output script or zip app that was written
+    # with deterministic set, or returns None if it has no manifest.
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zip_file:
+            if _zip_manifest_name not in zip_file.namelist():
+                return None
+            return json.loads(zip_file.read(_zip_manifest_name).decode("utf-8"))
+    else:
+        last_line = ""
+        with _open_source_file(path) as output_file:
+            for line in output_file:
+                last_line = line
+        if last_line.startswith(_script_manifest_prefix):
+            return json.loads(last_line[len(_script_manifest_prefix):])
+        else:
+            return None
+
+_zip_manifest_name = "stickytape-manifest.json"
+_script_manifest_prefix = "# stickytape-manifest: "
+
+def _manifest_json(content_hash, script_hash, file_hashes):
+    return json.dumps(
+        {"content_hash": content_hash, "script": script_hash, "files": file_hashes},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+class _HashingWriter(object):
+    # Writes text to output_file, hashing it as it's written
+    def __init__(self, output_file):
+        self._output_file = output_file
+        self._hash = hashlib.sha256()
+
+    def write(self, text):
+        self._hash.update(text.encode("utf-8"))
+        self._output_file.write(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+class _Analysis(object):
+    # State that can be shared between bundles written using the same options:
+    # the Python binary's sys.path and other properties, the imports found in
+    # each module, module resolvers, compiled bytecode, and the process pool
+    # used to parse modules.
+    def __init__(self, options):
+        if options.minify:
+            self._minifier = Minifier(
+                strip_annotations=options.strip_annotations,
+                preserve_line_numbers=options.preserve_line_numbers,
+            )
+        else:
+            self._minifier = None
+
+        self.options = options
+        self._interpreter_info = None
+        self._import_lines = {}
+        self._directory_listings = {}
+        self._resolvers = {}
+        self._caches = {}
+        self._bytecode = {}
+        self._executor = None
+        self._io_executor = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if self.options.jobs > 1:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.options.jobs)
+        if self.options.io_threads > 0:
+            self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.options.io_threads)
+        return self
+
+    def __exit__(self, *args):
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._io_executor is not None:
+            self._io_executor.shutdown()
+        if self.options.cache_dir is not None:
+            evict_cache(self.options.cache_dir)
+
+    def generate_modules(self, path, tree_shaking_report=None):
+        # Scripts that are written at the same time share the analysis, so
+        # modules are found for one script at a time. Writing the output,
+        # using the returned generator, can happen in parallel.
+        with self._lock:
+            return self._generate_modules(path, tree_shaking_report=tree_shaking_report)
+
+    def _generate_modules(self, path, tree_shaking_report):
+        options = self.options
+        interpreter_info = self._read_interpreter_info()
+        sys_path = [os.path.dirname(path)] + options.add_python_paths + interpreter_info.sys_path
+        cache = self._cache(sys_path)
+
+        if options.tree_shake:
+            static_guards = StaticGuards(
+                version_info=interpreter_info.version_info,
+                platform=interpreter_info.platform,
+                os_name=interpreter_info.os_name,
+            )
+        else:
+            static_guards = None
+
+        if options.use_interpreter_stdlib:
+            stdlib_module_names = interpreter_info.stdlib_module_names
+        else:
+            stdlib_module_names = None
+
+        generator = ModuleWriterGenerator(
+            sys_path,
+            cache=cache,
+            resolver=self._resolver(sys_path),
+            import_lines=self._import_lines,
+            static_guards=static_guards,
+            stdlib_module_names=stdlib_module_names,
+            minifier=self._minifier,
+            io_executor=self._io_executor,
+            deterministic=options.deterministic,
         )
-        return [
-            # TODO: handle non-UTF-8 encodings
-            line.strip().decode("utf-8")
-            for line in output.split(b"\n")
-            if line.strip()
+        generator.generate_for_file(path, add_python_modules=options.add_python_modules, executor=self._executor)
+        generator.add_package_data(options.package_data)
+        if tree_shaking_report is not None and static_guards is not None:
+            tree_shaking_report.add(path, generator)
+        if cache is not None:
+            cache.save()
+        if options.precompile:
+            generator.compile_modules(python_binary=options.python_binary, compiled=self._bytecode)
+        return generator
+
+    def searched_directories(self):
+        return sorted(set(
+            os.path.join(sys_path, *parts)
+            for sys_path, parts in self._directory_listings
+        ))
+
+    def invalidate(self, paths):
+        # Forgets what was read from the given files and directories, so that
+        # they're read again by the next bundle.
+        paths = set(paths)
+        for key in list(self._import_lines):
+            if key[0] in paths:
+                del self._import_lines[key]
+
+        changed_directories = [
+            key
+            for key in self._directory_listings
+            if any(_is_same_or_descendant(os.path.join(key[0], *key[1]), path) for path in paths)
+        ]
+        for key in changed_directories:
+            del self._directory_listings[key]
+        if changed_directories:
+            # Resolvers remember where modules were found
+            self._resolvers = {}
+            self._caches = {}
+
+    def _read_interpreter_info(self):
+        if self._interpreter_info is None:
+            if self.options.cache_dir is None:
+                cache = None
+            else:
+                cache = InterpreterCache(self.options.cache_dir)
+            fields = []
+            if self.options.include_extensions:
+                fields.append("extension_suffixes")
+            if self.options.use_interpreter_stdlib:
+                fields.append("stdlib_module_names")
+            self._interpreter_info = read_interpreter_info(self.options.python_binary, cache=cache, fields=fields)
+        return self._interpreter_info
+
+    def _extension_suffixes(self):
+        # Extension modules are only found when they're included, and only if
+        # they can be loaded by the target interpreter.
+        if self.options.include_extensions:
+            return self._read_interpreter_info().extension_suffixes
+        else:
+            return ()
+
+    def _resolver(self, sys_path):
+        key = tuple(sys_path)
+        if key not in self._resolvers:
+            self._resolvers[key] = ModuleResolver(
+                sys_path,
+                directory_listings=self._directory_listings,
+                extension_suffixes=self._extension_suffixes(),
+            )
+        return self._resolvers[key]
+
+    def _cache(self, sys_path):
+        if self.options.cache_dir is None:
+            return None
+
+        key = tuple(sys_path)
+        if key not in self._caches:
+            self._caches[key] = DependencyCache(
+                self.options.cache_dir,
+                sys_path=sys_path,
+                python_binary=self.options.python_binary,
+                extension_suffixes=self._extension_suffixes(),
+            )
+        return self._caches[key]
+
+class TreeShakingReport(object):
+    # Records the imports that were skipped when tree shaking, and the
+    # modules that would otherwise have been bundled.
+    def __init__(self):
+        self.pruned_imports = []
+        self.pruned_modules = []
+
+    @property
+    def bytes_saved(self):
+        return sum(module["size"] for module in self.pruned_modules)
+
+    def extend(self, other):
+        self.pruned_imports += other.pruned_imports
+        self.pruned_modules += other.pruned_modules
+
+    def add(self, script_path, generator):
+        for python_module, import_line in generator.pruned_imports:
+            self.pruned_imports.append({
+                "script": script_path,
+                "path": python_module.absolute_path,
+                "module": import_line.module_name,
+                "guard": import_line.guard,
+            })
+
+        for import_target in generator.find_pruned_modules():
+            self.pruned_modules.append({
+                "script": script_path,
+                "module": import_target.module_name,
+                "path": import_target.relative_path,
+                "size": os.path.getsize(import_target.absolute_path),
+            })
+
+    def to_json(self):
+        return {
+            "pruned_imports": self.pruned_imports,
+            "pruned_modules": self.pruned_modules,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+class BundleReport(object):
+    # Records the size of each bundled module and data file, both before and
+    # after being written to the output, how long each module took to parse,
+    # and the chain of imports that caused it to be bundled. Output sizes
+    # aren't known for files in a compressed blob. When minifying, the size of
+    # each module after minification is included too. Also records the total
+    # number of bytes read while bundling, and the time spent waiting for
+    # reads.
+    def __init__(self):
+        self.modules = []
+        self.data_files = []
+        self.bytes_read = 0
+        self.io_wait_time = 0
+
+    def extend(self, other):
+        self.modules += other.modules
+        self.data_files += other.data_files
+        self.bytes_read += other.bytes_read
+        self.io_wait_time += other.io_wait_time
+
+    def add(self, script_path, generator):
+        self.bytes_read += generator.bytes_read
+        self.io_wait_time += generator.io_wait_time
+
+        for module in generator.describe_modules():
+            module["script"] = script_path
+            self.modules.append(module)
+
+        for data_file in generator.describe_data_files():
+            data_file["script"] = script_path
+            self.data_files.append(data_file)
+
+    def to_json(self):
+        entries = self.modules + self.data_files
+        output_sizes = [entry["output_size"] for entry in entries]
+        if None in output_sizes:
+            total_output_size = None
+        else:
+            total_output_size = sum(output_sizes)
+
+        return {
+            "modules": self.modules,
+            "data_files": self.data_files,
+            "total_raw_size": sum(entry["raw_size"] for entry in entries),
+            "total_output_size": total_output_size,
+            "total_discovery_time": sum(module["discovery_time"] or 0 for module in self.modules),
+            "bytes_read": self.bytes_read,
+            "io_wait_time": self.io_wait_time,
+            "minification_saved": sum(
+                module["raw_size"] - module["minified_size"]
+                for module in self.modules
+                if module["minified_size"] is not None
+            ),
+        }
+
+    def summary(self, limit=10):
+        report = self.to_json()
+        lines = [
+            "{0} modules and {1} data files, {2} bytes of source and data, {3} bytes of output".format(
+                len(self.modules),
+                len(self.data_files),
+                report["total_raw_size"],
+                "unknown" if report["total_output_size"] is None else report["total_output_size"],
+            ),
+            "{0:.1f} ms spent finding imports".format(report["total_discovery_time"] * 1000),
+            "{0} bytes read, {1:.1f} ms spent waiting for reads".format(
+                report["bytes_read"],
+                report["io_wait_time"] * 1000,
+            ),
         ]
+        if any(module["minified_size"] is not None for module in self.modules):
+            lines.append("{0} bytes saved by minification".format(report["minification_saved"]))
+        lines.append("Largest contributors:")
+
+        def size(entry):
+            if entry["output_size"] is None:
+                return entry["raw_size"]
+            else:
+                return entry["output_size"]
+
+        largest = sorted(self.modules + self.data_files, key=size, reverse=True)[:limit]
+        for entry in largest:
+            description = entry.get("module", entry["path"])
+            if entry.get("included_by"):
+                description += " (via {0})".format(" -> ".join(entry["included_by"]))
+            lines.append("  {0:>10}  {1}".format(size(entry), description))
+
+        return "\n".join(lines) + "\n"
 
 def _indent(string):
     return "    " + string.replace("\n", "\n    ")
@@ -59,49 +710,543 @@ def _generate_shebang(path, copy):
 
     return "#!/usr/bin/env python"
 
-def _prelude():
-    prelude_path = os.path.join(os.path.dirname(__file__), "prelude.py")
+_prelude_filenames = {
+    "tempdir": "prelude.py",
+    "memory": "memory_prelude.py",
+    "lazy": "memory_prelude.py",
+    "cache": "cache_prelude.py",
+}
+
+def _prelude(import_mode):
+    if import_mode not in _prelude_filenames:
+        raise ValueError("Unknown import mode: " + repr(import_mode))
+
+    return "".join(
+        _read_prelude_file(filename)
+        for filename in ["profiling_prelude.py", "common_prelude.py", _prelude_filenames[import_mode]]
+    )
+
+def _read_prelude_file(filename):
+    prelude_path = os.path.join(os.path.dirname(__file__), filename)
     with open(prelude_path, encoding="utf-8") as prelude_file:
         return prelude_file.read()
 
-def _generate_module_writers(path, sys_path, add_python_modules):
-    generator = ModuleWriterGenerator(sys_path)
-    generator.generate_for_file(path, add_python_modules=add_python_modules)
-    return generator.build()
-
 class ModuleWriterGenerator(object):
-    def __init__(self, sys_path):
+    def __init__(self, sys_path, cache=None, resolver=None, import_lines=None, static_guards=None, stdlib_module_names=None, minifier=None, io_executor=None, deterministic=False):
+        # When static_guards is set, imports in branches that can't run on
+        # the target interpreter are skipped. When stdlib_module_names is set,
+        # it is used instead of the built-in list of standard library modules.
+        # When minifier is set, module sources are minified as they're
+        # written. When io_executor is set, files are read on its threads
+        # ahead of when they're needed. When deterministic is set, modules
+        # are written in order of their paths, rather than the order that
+        # they were found in.
+        if resolver is None:
+            resolver = ModuleResolver(sys_path)
+
+        if import_lines is None:
+            import_lines = {}
+
         self._sys_path = sys_path
+        self._cache = cache
+        self._import_lines = import_lines
+        self._static_guards = static_guards
+        self._stdlib_module_names = stdlib_module_names
+        self._minifier = minifier
+        self._reader = _PrefetchingReader(io_executor)
+        self._deterministic = deterministic
+        self.resolver = resolver
         self._modules = {}
+        self._bytecode = {}
+        self._data_files = {}
+        self._included_by = {}
+        self._discovery_times = {}
+        self._output_sizes = {}
+        self._minified_sizes = {}
+        self._written_hashes = {}
+        # The hashes of module sources read when finding imports
+        self._source_hashes = {}
+        self.pruned_imports = []
 
-    def build(self):
-        output = []
-        for module_path, module_source in self._modules.values():
-            output.append("    __stickytape_write_module({0}, {1})\n".format(
+    def compile_modules(self, python_binary, compiled=None):
+        # compiled maps each (path, source) pair to its bytecode, and can be
+        # shared between generators to avoid compiling modules again.
+        if compiled is None:
+            compiled = {}
+
+        modules = dict(
+            (module_name, (import_target.relative_path, self._read_module_source(import_target)))
+            for module_name, import_target in self._prefetched_modules()
+            if not import_target.is_extension
+        )
+        uncompiled_modules = [
+            module
+            for module in set(modules.values())
+            if module not in compiled
+        ]
+        if uncompiled_modules:
+            bytecode = compile_modules(uncompiled_modules, python_binary=python_binary)
+            compiled.update(zip(uncompiled_modules, bytecode))
+
+        self._bytecode = dict(
+            (module_name, compiled[module])
+            for module_name, module in modules.items()
+        )
+
+    def content_hash(self):
+        # A hash of the path and contents of every file that the output
+        # script writes. Modules are hashed by their source before
+        # minification, along with how they're minified, so that sources
+        # read when finding imports don't need to be read or minified again.
+        content_hash = hashlib.sha256(_content_hash_version)
+        if self._minifier is not None:
+            _update_content_hash(content_hash, "minifier", repr(self._minifier.key()).encode("utf-8"))
+        for module_name, import_target in self._modules_in_output_order():
+            source_hash = self._source_hashes.get(import_target.absolute_path)
+            if source_hash is None:
+                source_hash = content_hash_of(self._reader.read(import_target.absolute_path))
+            _update_content_hash(content_hash, import_target.relative_path, source_hash.encode("ascii"))
+            if module_name in self._bytecode:
+                _update_content_hash(content_hash, import_target.relative_path + "c", self._bytecode[module_name])
+        for data_path, absolute_path in sorted(self._data_files.items()):
+            _update_content_hash(content_hash, data_path, _read_binary(absolute_path))
+        return content_hash.hexdigest()
+
+    # Module sources are read as they're written, so only one module source
+    # is held in memory at a time.
+
+    @property
+    def bytes_read(self):
+        return self._reader.bytes_read
+
+    @property
+    def io_wait_time(self):
+        return self._reader.wait_time
+
+    def _prefetched_modules(self):
+        # Yields each module, reading the sources of the next few modules on
+        # the I/O threads while the current one is used, so that only a few
+        # sources are held in memory at a time.
+        modules = self._modules_in_output_order()
+        for index, module in enumerate(modules):
+            for module_name, import_target in modules[index:index + _prefetch_window]:
+                if not import_target.is_extension:
+                    self._reader.prefetch(import_target.absolute_path)
+            yield module
+
+    def _modules_in_output_order(self):
+        if self._deterministic:
+            return sorted(self._modules.items(), key=lambda module: module[1].relative_path)
+        else:
+            return list(self._modules.items())
+
+    def _read_module_source(self, import_target):
+        source = self._reader.read(import_target.absolute_path)
+        if self._minifier is not None and not import_target.is_extension:
+            source = self._minifier.minify(source)
+            self._minified_sizes[import_target.relative_path] = len(source)
+        self._written_hashes[import_target.relative_path] = content_hash_of(source)
+        return source
+
+    def file_hashes(self):
+        # Maps the path of each file in the output to the hash of its
+        # contents, as written. Bytecode is stored at the module's path
+        # followed by "c", as in zip apps. Only known once the output has
+        # been written.
+        file_hashes = dict(self._written_hashes)
+        for module_name, import_target in self._modules.items():
+            if module_name in self._bytecode:
+                file_hashes[import_target.relative_path + "c"] = content_hash_of(self._bytecode[module_name])
+        for data_path, absolute_path in self._data_files.items():
+            file_hashes[data_path] = content_hash_of(_read_binary(absolute_path))
+        return file_hashes
+
+    def write(self, output_file, compress_data=False):
+        # Files with the same contents as a file that has already been
+        # written are read back from that file rather than being written to
+        # the output again, unless the contents are shorter than the reference,
+        # such as for empty __init__.py files.
+        written_paths = {}
+
+        def contents_literal(path, contents):
+            literal = repr(contents)
+            original_path = written_paths.setdefault(content_hash_of(contents), path)
+            reference = "__stickytape_read_file({0})".format(repr(original_path))
+            if original_path != path and len(reference) < len(literal):
+                return reference
+            else:
+                return literal
+
+        for module_name, import_target in self._prefetched_modules():
+            module_path = import_target.relative_path
+            lines = ["    __stickytape_write_module({0}, {1})\n".format(
                 repr(module_path),
-                repr(module_source)
-            ))
-        return "".join(output)
+                contents_literal(module_path, self._read_module_source(import_target))
+            )]
+            if module_name in self._bytecode:
+                lines.append("    __stickytape_write_bytecode({0}, {1})\n".format(
+                    repr(module_path),
+                    repr(self._bytecode[module_name])
+                ))
+            output_file.writelines(lines)
+            self._output_sizes[module_path] = sum(len(line) for line in lines)
+
+        for data_path, absolute_path in sorted(self._data_files.items()):
+            if compress_data and _is_large_file(absolute_path):
+                self._output_sizes[data_path] = _write_compressed_file(output_file, data_path, absolute_path)
+            else:
+                line = "    __stickytape_write_data({0}, {1})\n".format(
+                    repr(data_path),
+                    contents_literal(data_path, self._reader.read(absolute_path))
+                )
+                output_file.write(line)
+                self._output_sizes[data_path] = len(line)
+
+    def write_index(self, output_file, compression=None):
+        # All module sources are stored in a single blob, with an index of
+        # offsets, so that the output script does no work for a module until
+        # it is imported. A compressed blob is decompressed on first use.
+        # The blob is written first so that offsets are known by the time the
+        # index is written. Files with the same contents share the same part
+        # of the blob.
+        files = []
+        bytecode = []
+        packages = set()
+        directories = set()
+        offset = 0
+        blob_offsets = {}
+
+        output_file.write("    __stickytape_add_module_index(\n")
+        output_file.write("        blob=(\n")
+        blob_writer = _BlobWriter(output_file, compression=compression)
+
+        def add_to_blob(index, path, contents):
+            nonlocal offset
+            blob_size = blob_writer.size
+            content_hash = content_hash_of(contents)
+            if content_hash not in blob_offsets:
+                blob_offsets[content_hash] = (offset, offset + len(contents))
+                blob_writer.write(contents)
+                offset += len(contents)
+
+            index_line = "            {0}: ({1}, {2}),\n".format(
+                repr(path),
+                *blob_offsets[content_hash]
+            )
+            index.append(index_line)
+
+            # Compressed data can't be attributed to a single file
+            if compression is None:
+                output_size = len(index_line) + blob_writer.size - blob_size
+                self._output_sizes[path] = self._output_sizes.get(path, 0) + output_size
+            else:
+                self._output_sizes[path] = None
+
+        for module_name, import_target in self._prefetched_modules():
+            module_path = import_target.relative_path
+            self._output_sizes.pop(module_path, None)
+            add_to_blob(files, module_path, self._read_module_source(import_target))
+            if module_name in self._bytecode:
+                add_to_blob(bytecode, module_path, self._bytecode[module_name])
+            packages.update(_parent_directories(module_path))
+
+        # Large data files are compressed separately, so that they're only
+        # decompressed when they're read.
+        large_data_files = []
+        for data_path, absolute_path in sorted(self._data_files.items()):
+            if _is_large_file(absolute_path):
+                large_data_files.append((data_path, absolute_path))
+            else:
+                add_to_blob(files, data_path, self._reader.read(absolute_path))
+            directories.update(_parent_directories(data_path))
+
+        blob_writer.close()
+        output_file.write("        ),\n")
+        output_file.write("        compression={0},\n".format(repr(compression)))
+        output_file.write("        files={\n")
+        output_file.writelines(files)
+        output_file.write("        },\n")
+        output_file.write("        bytecode={\n")
+        output_file.writelines(bytecode)
+        output_file.write("        },\n")
+        output_file.write("        packages={0},\n".format(repr(sorted(packages))))
+        output_file.write("        directories={0},\n".format(repr(sorted(packages | directories))))
+        output_file.write("    )\n")
+
+        for data_path, absolute_path in large_data_files:
+            self._output_sizes[data_path] = _write_compressed_file(output_file, data_path, absolute_path)
+
+    def write_to_blob_store(self, output_file, blob_store):
+        # Module sources, bytecode and data files are written to the blob
+        # store instead of the output, which only contains the hash of each
+        # file's contents.
+        files = []
+        bytecode = []
+        packages = set()
+        directories = set()
+
+        def add_to_store(index, path, contents):
+            index_line = "            {0}: {1},\n".format(repr(path), repr(blob_store.add(contents)))
+            index.append(index_line)
+            self._output_sizes[path] = self._output_sizes.get(path, 0) + len(index_line)
+
+        for module_name, import_target in self._prefetched_modules():
+            module_path = import_target.relative_path
+            self._output_sizes.pop(module_path, None)
+            add_to_store(files, module_path, self._read_module_source(import_target))
+            if module_name in self._bytecode:
+                add_to_store(bytecode, module_path, self._bytecode[module_name])
+            packages.update(_parent_directories(module_path))
+
+        for data_path, absolute_path in sorted(self._data_files.items()):
+            add_to_store(files, data_path, self._reader.read(absolute_path))
+            directories.update(_parent_directories(data_path))
+
+        output_file.write("    __stickytape_add_blob_store(\n")
+        output_file.write("        root={0},\n".format(repr(blob_store.root)))
+        output_file.write("        files={\n")
+        output_file.writelines(files)
+        output_file.write("        },\n")
+        output_file.write("        bytecode={\n")
+        output_file.writelines(bytecode)
+        output_file.write("        },\n")
+        output_file.write("        packages={0},\n".format(repr(sorted(packages))))
+        output_file.write("        directories={0},\n".format(repr(sorted(packages | directories))))
+        output_file.write("    )\n")
+
+    def write_extension_index(self, output_file):
+        # Extension modules can only be loaded from a file, so the memory
+        # importer needs the hash of each one to find or write its file.
+        extensions = [
+            "        {0}: ({1}, {2}),\n".format(
+                repr(module_name),
+                repr(import_target.relative_path),
+                repr(content_hash_of(import_target.read_binary())),
+            )
+            for module_name, import_target in self._modules_in_output_order()
+            if import_target.is_extension
+        ]
+        if extensions:
+            output_file.write("    __stickytape_add_extensions({\n")
+            output_file.writelines(extensions)
+            output_file.write("    })\n")
+
+    def write_zip(self, zip_file):
+        module_paths = set()
+        directories = set()
+        for module_name, import_target in self._prefetched_modules():
+            module_path = import_target.relative_path
+            info = _write_zip_entry(zip_file, module_path, self._read_module_source(import_target))
+            output_size = info.compress_size
+            if module_name in self._bytecode:
+                info = _write_zip_entry(
+                    zip_file,
+                    module_path + "c",
+                    _unchecked_pyc(self._bytecode[module_name]),
+                )
+                output_size += info.compress_size
+            self._output_sizes[module_path] = output_size
+            module_paths.add(module_path)
+            directories.update(_parent_directories(module_path))
+
+        for data_path, absolute_path in sorted(self._data_files.items()):
+            info = _write_zip_entry(zip_file, data_path, self._reader.read(absolute_path))
+            self._output_sizes[data_path] = info.compress_size
+
+        for directory in sorted(directories):
+            init_path = directory + "/__init__.py"
+            if init_path not in module_paths:
+                _write_zip_entry(zip_file, init_path, b"\n")
+                self._written_hashes[init_path] = content_hash_of(b"\n")
+
+    def generate_for_file(self, python_file_path, add_python_modules, executor=None):
+        script_module = ImportTarget(python_file_path, relative_path=None, is_package=False, module_name=None)
+        add_import_lines = [
+            ImportLine(module_name=add_python_module, items=[])
+            for add_python_module in add_python_modules
+        ]
+
+        if executor is not None:
+            self._find_imports_in_parallel(script_module, add_import_lines, executor=executor)
 
-    def generate_for_file(self, python_file_path, add_python_modules):
-        self._generate_for_module(ImportTarget(python_file_path, relative_path=None, is_package=False, module_name=None))
+        self._generate_for_module(script_module)
 
-        for add_python_module in add_python_modules:
-            import_line = ImportLine(module_name=add_python_module, items=[])
+        for import_line in add_import_lines:
             self._generate_for_import(python_module=None, import_line=import_line)
 
+    def add_package_data(self, package_data):
+        # package_data maps package names to glob patterns of data files,
+        # relative to the package's directory. Each package is bundled along
+        # with its data files.
+        for package_name, patterns in package_data.items():
+            self._generate_for_import(None, ImportLine(package_name, []))
+            package = self._modules.get(package_name)
+            if package is None or not package.is_package:
+                continue
+
+            package_directory = os.path.dirname(package.absolute_path)
+            package_path = os.path.dirname(package.relative_path)
+            module_paths = set(module.relative_path for module in self._modules.values())
+            for pattern in patterns:
+                for absolute_path in glob.glob(os.path.join(glob.escape(package_directory), pattern), recursive=True):
+                    if not os.path.isfile(absolute_path):
+                        continue
+
+                    relative_path = os.path.relpath(absolute_path, package_directory).replace(os.sep, "/")
+                    data_path = package_path + "/" + relative_path
+                    if data_path not in module_paths:
+                        self._data_files[data_path] = absolute_path
+
+    def _find_imports_in_parallel(self, script_module, add_import_lines, executor):
+        # Parse modules breadth-first on a process pool. The depth-first
+        # traversal that determines the output then uses the parsed imports,
+        # so the output is the same as when parsing serially.
+        futures = {}
+        visited_module_names = set()
+
+        def visit_module(python_module):
+            if python_module.module_name in visited_module_names:
+                return
+            visited_module_names.add(python_module.module_name)
+
+            import_lines = self._read_cached_imports(python_module, self._static_guards)
+            if import_lines is None:
+                future = executor.submit(_list_imports_in_module, python_module, self._static_guards)
+                futures[future] = python_module
+            else:
+                visit_imports(python_module, import_lines)
+
+        def visit_imports(python_module, import_lines):
+            for import_line in import_lines:
+                if import_line.guard is None and not self._is_stdlib_import(import_line):
+                    visit_import(python_module, import_line)
+
+        def visit_import(python_module, import_line):
+            for import_target in self._read_possible_import_targets(python_module, import_line):
+                visit_module(import_target)
+
+        visit_module(script_module)
+        for import_line in add_import_lines:
+            visit_import(None, import_line)
+
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                python_module = futures.pop(future)
+                import_lines = future.result()
+                self._write_imports(python_module, import_lines, self._static_guards)
+                visit_imports(python_module, import_lines)
+
+    def source_paths(self):
+        return [
+            import_target.absolute_path
+            for import_target in self._modules.values()
+        ] + sorted(self._data_files.values())
+
+    def describe_modules(self):
+        # Sizes are only known once the output has been written
+        return [
+            {
+                "module": module_name,
+                "path": import_target.relative_path,
+                "raw_size": os.path.getsize(import_target.absolute_path),
+                "minified_size": self._minified_sizes.get(import_target.relative_path),
+                "output_size": self._output_sizes.get(import_target.relative_path),
+                "discovery_time": self._discovery_times.get(module_name),
+                "included_by": self._inclusion_chain(module_name),
+            }
+            for module_name, import_target in self._modules.items()
+        ]
+
+    def describe_data_files(self):
+        return [
+            {
+                "path": data_path,
+                "raw_size": os.path.getsize(absolute_path),
+                "output_size": self._output_sizes.get(data_path),
+            }
+            for data_path, absolute_path in sorted(self._data_files.items())
+        ]
+
+    def _inclusion_chain(self, module_name):
+        # The modules whose imports caused module_name to be bundled,
+        # starting with the script. Modules that were explicitly added have
+        # an empty chain.
+        chain = []
+        importer = self._included_by.get(module_name)
+        while importer is not None:
+            if importer.module_name is None:
+                chain.append(importer.absolute_path)
+                break
+            chain.append(importer.module_name)
+            importer = self._included_by.get(importer.module_name)
+        return list(reversed(chain))
+
     def _generate_for_module(self, python_module):
-        import_lines = _find_imports_in_module(python_module)
+        start_time = time.perf_counter()
+        import_lines = self._find_imports(python_module, self._static_guards)
+        self._discovery_times[python_module.module_name] = time.perf_counter() - start_time
+        self._prefetch_imports(python_module, import_lines)
         for import_line in import_lines:
-            if not _is_stdlib_import(import_line):
+            if import_line.guard is not None:
+                self.pruned_imports.append((python_module, import_line))
+            elif not self._is_stdlib_import(import_line):
                 self._generate_for_import(python_module, import_line)
 
+    def _prefetch_imports(self, python_module, import_lines):
+        # Reads the modules that will be parsed next on the I/O threads while
+        # the modules before them are parsed. When using the dependency
+        # cache, modules usually don't need to be read at all, so they aren't
+        # read ahead of time.
+        if not self._reader.is_prefetching or self._cache is not None:
+            return
+
+        for import_line in import_lines:
+            if import_line.guard is None and not self._is_stdlib_import(import_line):
+                for import_target in self._read_possible_import_targets(python_module, import_line):
+                    if (
+                        import_target.module_name not in self._modules and
+                        not import_target.is_extension and
+                        _module_key(import_target, self._static_guards) not in self._import_lines
+                    ):
+                        self._reader.prefetch(import_target.absolute_path)
+
+    def _is_stdlib_import(self, import_line):
+        if self._stdlib_module_names is None:
+            return is_stdlib_module(import_line.module_name)
+        else:
+            # Submodules of standard library packages are in the standard
+            # library too
+            return import_line.module_name.partition(".")[0] in self._stdlib_module_names
+
+    def find_pruned_modules(self):
+        # Finds the modules that would have been bundled if imports hadn't
+        # been pruned.
+        pruned_modules = collections.OrderedDict()
+
+        def visit_import(python_module, import_line):
+            if self._is_stdlib_import(import_line):
+                return
+
+            for import_target in self._read_possible_import_targets(python_module, import_line):
+                module_name = import_target.module_name
+                if module_name not in self._modules and module_name not in pruned_modules:
+                    pruned_modules[module_name] = import_target
+                    for target_import_line in self._find_imports(import_target, static_guards=None):
+                        visit_import(import_target, target_import_line)
+
+        for python_module, import_line in self.pruned_imports:
+            visit_import(python_module, import_line)
+
+        return list(pruned_modules.values())
+
     def _generate_for_import(self, python_module, import_line):
         import_targets = self._read_possible_import_targets(python_module, import_line)
 
         for import_target in import_targets:
             if import_target.module_name not in self._modules:
-                self._modules[import_target.module_name] = (import_target.relative_path, import_target.read_binary())
+                self._modules[import_target.module_name] = import_target
+                self._included_by[import_target.module_name] = python_module
                 self._generate_for_module(import_target)
 
     def _read_possible_import_targets(self, python_module, import_line):
@@ -129,34 +1274,206 @@ class ModuleWriterGenerator(object):
         #~ else:
             #~ raise RuntimeError("Could not find module: " + import_line.import_path)
 
+    def _find_imports(self, python_module, static_guards):
+        import_lines = self._read_cached_imports(python_module, static_guards)
+        if import_lines is None:
+            if python_module.is_extension:
+                source = None
+            else:
+                source = self._reader.read(python_module.absolute_path)
+                self._source_hashes[python_module.absolute_path] = content_hash_of(source)
+            import_lines = _list_imports_in_module(python_module, static_guards, source=source)
+            self._write_imports(python_module, import_lines, static_guards)
+        return import_lines
+
+    def _read_cached_imports(self, python_module, static_guards):
+        key = _module_key(python_module, static_guards)
+        if key in self._import_lines:
+            return self._import_lines[key]
+
+        if self._cache is not None:
+            cached_import_lines = self._cache.read_import_lines(
+                python_module,
+                variant=_static_guards_key(static_guards),
+            )
+            if cached_import_lines is not None:
+                import_lines = [
+                    ImportLine(module_name, items, guard=guard)
+                    for module_name, items, guard in cached_import_lines
+                ]
+                self._import_lines[key] = import_lines
+                return import_lines
+
+        return None
+
+    def _write_imports(self, python_module, import_lines, static_guards):
+        self._import_lines[_module_key(python_module, static_guards)] = import_lines
+        if self._cache is not None:
+            self._cache.write_import_lines(
+                python_module,
+                [
+                    [import_line.module_name, import_line.items, import_line.guard]
+                    for import_line in import_lines
+                ],
+                variant=_static_guards_key(static_guards),
+            )
+
     def _find_module(self, module_name):
+        if self._cache is None:
+            return self._search_sys_path(module_name)
+
+        try:
+            cached_target = self._cache.resolved_module(module_name)
+        except KeyError:
+            import_target = self._search_sys_path(module_name)
+            self._cache.write_resolved_module(
+                module_name,
+                None if import_target is None else vars(import_target),
+            )
+            return import_target
+        else:
+            return None if cached_target is None else ImportTarget(**cached_target)
+
+    def _search_sys_path(self, module_name):
+        return self.resolver.find_module(module_name)
+
+
+class ModuleResolver(object):
+    # Finds modules by listing each directory at most once, rather than
+    # checking whether each possible path exists. Both found and missing
+    # modules are memoized.
+    def __init__(self, sys_path, directory_listings=None, extension_suffixes=()):
+        # directory_listings can be shared between resolvers with different
+        # sys.paths. Extension modules are found using extension_suffixes,
+        # which are tried before .py files, like the interpreter does.
+        if directory_listings is None:
+            directory_listings = {}
+
+        self._sys_path = sys_path
+        self._directory_listings = directory_listings
+        self._extension_suffixes = extension_suffixes
+        self._modules = {}
+        self.filesystem_calls = 0
+        self._naive_filesystem_calls = 0
+
+    @property
+    def filesystem_calls_saved(self):
+        # The number of calls saved compared to checking whether each
+        # possible path exists on every lookup.
+        return self._naive_filesystem_calls - self.filesystem_calls
+
+    def find_module(self, module_name):
+        if module_name not in self._modules:
+            self._modules[module_name] = self._search_sys_path(module_name)
+
+        import_target = self._modules[module_name]
+        self._naive_filesystem_calls += self._count_naive_filesystem_calls(import_target)
+        return import_target
+
+    def _search_sys_path(self, module_name):
+        parts = module_name.split(".")
         for sys_path in self._sys_path:
-            for is_package in (True, False):
-                if is_package:
-                    suffix = "/__init__.py"
-                else:
-                    suffix = ".py"
-
-                relative_path = module_name.replace(".", "/") + suffix
-                full_module_path = os.path.join(sys_path, relative_path)
-                if os.path.exists(full_module_path):
-                    return ImportTarget(
-                        full_module_path,
-                        relative_path=relative_path,
-                        is_package=is_package,
-                        module_name=module_name,
-                    )
+            parent_listing = self._list_directory(sys_path, tuple(parts[:-1]))
+            if parent_listing is None:
+                continue
+
+            package_listing = self._list_directory(sys_path, tuple(parts))
+            if package_listing is not None and "__init__.py" in package_listing:
+                return self._import_target(sys_path, module_name, "/__init__.py", is_package=True)
+
+            for suffix in self._extension_suffixes:
+                if parts[-1] + suffix in parent_listing:
+                    return self._import_target(sys_path, module_name, suffix, is_extension=True)
+
+            if parts[-1] + ".py" in parent_listing:
+                return self._import_target(sys_path, module_name, ".py")
         return None
 
+    def _import_target(self, sys_path, module_name, suffix, is_package=False, is_extension=False):
+        relative_path = module_name.replace(".", "/") + suffix
+        return ImportTarget(
+            os.path.join(sys_path, relative_path),
+            relative_path=relative_path,
+            is_package=is_package,
+            module_name=module_name,
+            is_extension=is_extension,
+        )
+
+    def _list_directory(self, sys_path, parts):
+        key = (sys_path, parts)
+        if key not in self._directory_listings:
+            if parts:
+                parent_listing = self._list_directory(sys_path, parts[:-1])
+                exists = parent_listing is not None and parts[-1] in parent_listing
+            else:
+                exists = True
+
+            listing = None
+            if exists:
+                self.filesystem_calls += 1
+                try:
+                    listing = frozenset(os.listdir(os.path.join(sys_path, *parts) or "."))
+                except OSError:
+                    pass
+
+            self._directory_listings[key] = listing
+
+        return self._directory_listings[key]
+
+    def _count_naive_filesystem_calls(self, import_target):
+        # Checking each directory on sys.path takes one call for the package,
+        # one for each extension suffix, and one for the .py file.
+        calls_per_directory = 2 + len(self._extension_suffixes)
+        if import_target is None:
+            return calls_per_directory * len(self._sys_path)
+        else:
+            sys_path_index = next(
+                index
+                for index, sys_path in enumerate(self._sys_path)
+                if os.path.join(sys_path, import_target.relative_path) == import_target.absolute_path
+            )
+            if import_target.is_package:
+                calls = 1
+            elif import_target.is_extension:
+                calls = 2 + next(
+                    index
+                    for index, suffix in enumerate(self._extension_suffixes)
+                    if import_target.relative_path.endswith(suffix)
+                )
+            else:
+                calls = calls_per_directory
+            return calls_per_directory * sys_path_index + calls
+
+
+def _module_key(python_module, static_guards=None):
+    return (
+        python_module.absolute_path,
+        python_module.module_name,
+        python_module.is_package,
+        _static_guards_key(static_guards),
+    )
+
+
+def _static_guards_key(static_guards):
+    return None if static_guards is None else static_guards.key()
+
+
+def _list_imports_in_module(python_module, static_guards=None, source=None):
+    # Imports made by extension modules can't be found
+    if python_module.is_extension:
+        return []
+    return list(_find_imports_in_module(python_module, static_guards=static_guards, source=source))
+
 
-def _find_imports_in_module(python_module):
-    source = _read_binary(python_module.absolute_path)
+def _find_imports_in_module(python_module, static_guards=None, source=None):
+    if source is None:
+        source = _read_binary(python_module.absolute_path)
     parse_tree = ast.parse(source, python_module.absolute_path)
 
-    for node in ast.walk(parse_tree):
+    for node, guard in _walk(parse_tree, static_guards, source):
         if isinstance(node, ast.Import):
             for name in node.names:
-                yield ImportLine(name.name, [])
+                yield ImportLine(name.name, [], guard=guard)
 
         if isinstance(node, ast.ImportFrom):
             if node.level == 0:
@@ -177,7 +1494,196 @@ def _find_imports_in_module(python_module):
                 else:
                     module = package_name + "." + node.module
 
-            yield ImportLine(module, [name.name for name in node.names])
+            yield ImportLine(module, [name.name for name in node.names], guard=guard)
+
+
+def _walk(parse_tree, static_guards, source):
+    # Yields each statement in the same order as ast.walk, along with a
+    # description of the condition that makes the statement unreachable on
+    # the target interpreter, or None if the statement may be reachable.
+    # Expressions can't contain statements, so they aren't visited. Nodes
+    # that contain statements are visited breadth-first, like ast.walk, so
+    # imports are found in the same order as when visiting every node.
+    nodes = collections.deque([(parse_tree, None)])
+    while nodes:
+        node, guard = nodes.popleft()
+        yield node, guard
+
+        dead_branch = ()
+        if guard is None and static_guards is not None and isinstance(node, ast.If):
+            condition = static_guards.evaluate(node.test)
+            if condition is not None:
+                dead_branch = set(map(id, node.orelse if condition else node.body))
+                dead_guard = "line {0}: {1}{2}".format(
+                    node.lineno,
+                    _source_line(source, node.lineno),
+                    " (else)" if condition else "",
+                )
+
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _statement_containers):
+                if id(child) in dead_branch:
+                    nodes.append((child, dead_guard))
+                else:
+                    nodes.append((child, guard))
+
+
+# Statements, and the nodes between a statement and the statements in its
+# body, such as except clauses and match cases
+_statement_containers = (ast.stmt, ast.excepthandler) + ((ast.match_case,) if hasattr(ast, "match_case") else ())
+
+
+def _source_line(source, lineno):
+    return source.splitlines()[lineno - 1].decode("utf-8", "replace").strip()
+
+
+class _PrefetchingReader(object):
+    # Reads files, either immediately or from reads started earlier on the
+    # threads of executor. Records the number of bytes read, and the time
+    # spent waiting for reads to finish.
+    def __init__(self, executor):
+        self._executor = executor
+        self._pending = {}
+        self.bytes_read = 0
+        self.wait_time = 0
+
+    @property
+    def is_prefetching(self):
+        return self._executor is not None
+
+    def prefetch(self, path):
+        if self._executor is not None and path not in self._pending:
+            self._pending[path] = self._executor.submit(_read_binary, path)
+
+    def read(self, path):
+        start_time = time.perf_counter()
+        future = self._pending.pop(path, None)
+        contents = _read_binary(path) if future is None else future.result()
+        self.wait_time += time.perf_counter() - start_time
+        self.bytes_read += len(contents)
+        return contents
+
+
+# The number of modules read ahead of the module being written
+_prefetch_window = 8
+
+
+def _is_large_file(path):
+    return os.path.getsize(path) >= _large_file_size
+
+
+_large_file_size = 64 * 1024
+
+
+def _write_compressed_file(output_file, data_path, absolute_path):
+    # Returns the number of characters written
+    header = "    __stickytape_write_compressed_file(\n        {0},\n        (\n".format(repr(data_path))
+    footer = "        ),\n    )\n"
+    output_file.write(header)
+    blob_writer = _BlobWriter(output_file, compression="zlib")
+    with open(absolute_path, "rb") as data_file:
+        for chunk in iter(lambda: data_file.read(_large_file_size), b""):
+            blob_writer.write(chunk)
+    blob_writer.close()
+    output_file.write(footer)
+    return len(header) + blob_writer.size + len(footer)
+
+
+class _BlobWriter(object):
+    # Writes the blob of a module index as a sequence of string literals.
+    # When compressed, the blob is compressed and base85 encoded
+    # incrementally, and written in lines of a fixed length.
+    def __init__(self, output_file, compression):
+        self._output_file = output_file
+        self._compressor = None if compression is None else _compressor(compression)
+        self._pending_bytes = b""
+        self._pending_text = ""
+        self._is_empty = True
+        self.size = 0
+
+    def write(self, contents):
+        if self._compressor is None:
+            self._write_literal(contents)
+        else:
+            self._encode(self._compressor.compress(contents), final=False)
+
+    def close(self):
+        if self._compressor is not None:
+            self._encode(self._compressor.flush(), final=True)
+
+        if self._is_empty:
+            self._write_literal(b"")
+
+    def _encode(self, data, final):
+        # Each group of four bytes is encoded separately, so encoding whole
+        # groups as they're available gives the same result as encoding all
+        # of the data at once.
+        data = self._pending_bytes + data
+        encoded_length = len(data) if final else len(data) - len(data) % 4
+        self._pending_bytes = data[encoded_length:]
+        self._pending_text += base64.b85encode(data[:encoded_length]).decode("ascii")
+
+        while len(self._pending_text) >= _compressed_line_length or (final and self._pending_text):
+            self._write_literal(self._pending_text[:_compressed_line_length])
+            self._pending_text = self._pending_text[_compressed_line_length:]
+
+    def _write_literal(self, contents):
+        line = "            {0}\n".format(repr(contents))
+        self._output_file.write(line)
+        self._is_empty = False
+        self.size += len(line)
+
+
+_compressed_line_length = 1024
+
+
+def _compressor(compression):
+    if compression == "zlib":
+        import zlib
+        return zlib.compressobj(9)
+    elif compression == "lzma":
+        import lzma
+        return lzma.LZMACompressor()
+    else:
+        raise ValueError("Unknown compression: " + repr(compression))
+
+
+def _write_zip_entry(zip_file, name, contents):
+    # Use a fixed timestamp so that the archive only depends on its contents
+    info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    info.compress_type = zip_file.compression
+    info.external_attr = 0o644 << 16
+    zip_file.writestr(info, contents)
+    return info
+
+
+def _unchecked_pyc(bytecode):
+    # An unchecked hash-based pyc (PEP 552) is used by zipimport without
+    # comparing it against the source. Interpreters older than Python 3.7
+    # read the flags as a mismatched timestamp, and fall back to the source.
+    return bytecode[:4] + b"\x01\0\0\0" + b"\0" * 8 + bytecode[4:]
+
+
+def _parent_directories(path):
+    directory = path.rpartition("/")[0]
+    while directory:
+        yield directory
+        directory = directory.rpartition("/")[0]
+
+
+# Increment when the way that the cache import mode extracts files changes
+_content_hash_version = b"stickytape-cache-1"
+
+
+def _update_content_hash(content_hash, path, contents):
+    path = path.encode("utf-8")
+    content_hash.update(struct.pack("<QQ", len(path), len(contents)))
+    content_hash.update(path)
+    content_hash.update(contents)
+
+
+def _is_same_or_descendant(path, directory):
+    return path == directory or path.startswith(os.path.join(directory, ""))
 
 
 def _read_binary(path):
@@ -189,20 +1695,19 @@ def _open_source_file(path):
     return open(path, "rt", encoding="utf-8")
 
 
-def _is_stdlib_import(import_line):
-    return is_stdlib_module(import_line.module_name)
-
 class ImportTarget(object):
-    def __init__(self, absolute_path, relative_path, is_package, module_name):
+    def __init__(self, absolute_path, relative_path, is_package, module_name, is_extension=False):
         self.absolute_path = absolute_path
         self.relative_path = relative_path
         self.is_package = is_package
         self.module_name = module_name
+        self.is_extension = is_extension
 
     def read_binary(self):
         return _read_binary(self.absolute_path)
 
 class ImportLine(object):
-    def __init__(self, module_name, items):
+    def __init__(self, module_name, items, guard=None):
         self.module_name = module_name
         self.items = items
+        self.guard = guard
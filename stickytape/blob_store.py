@@ -0,0 +1,41 @@
+import hashlib
+import os
+import os.path
+import tempfile
+
+
+# A directory of files named by the hash of their contents, which can be
+# shared by many bundles installed on the same host. Bundles read files from
+# the store using its absolute path, so the store must be installed at the
+# same path that it was written to.
+class BlobStore(object):
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def add(self, contents):
+        content_hash = content_hash_of(contents)
+        path = os.path.join(self.root, content_hash[:2], content_hash)
+        if not os.path.exists(path):
+            _write_atomically(path, contents)
+        return content_hash
+
+
+def content_hash_of(contents):
+    return hashlib.sha256(contents).hexdigest()
+
+
+def _write_atomically(path, contents):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Bundles may read the store while it is being written to, so files are
+    # written to a temporary file that is then renamed.
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as blob_file:
+            blob_file.write(contents)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
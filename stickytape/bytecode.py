@@ -0,0 +1,42 @@
+import importlib.util
+import marshal
+import subprocess
+import sys
+
+
+def compile_modules(modules, python_binary=None):
+    # Each module is a (filename, source) pair. The result is a list of
+    # marshalled code objects, each prefixed with the magic number of the
+    # interpreter that compiled it.
+    if python_binary is None:
+        return _compile_modules(modules)
+    else:
+        result = subprocess.run(
+            [python_binary, "-E", "-c", _compiler_source()],
+            input=marshal.dumps(modules, 2),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        return marshal.loads(result.stdout)
+
+
+def _compile_modules(modules):
+    magic = importlib.util.MAGIC_NUMBER
+    return [
+        magic + marshal.dumps(compile(source, filename, "exec", dont_inherit=True))
+        for filename, source in modules
+    ]
+
+
+def _compiler_source():
+    with open(__file__, encoding="utf-8") as compiler_file:
+        return compiler_file.read()
+
+
+def _main():
+    modules = marshal.loads(sys.stdin.buffer.read())
+    sys.stdout.buffer.write(marshal.dumps(_compile_modules(modules), 2))
+
+
+if __name__ == "__main__":
+    _main()
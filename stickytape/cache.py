@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import tempfile
+
+
+# Increment when the format of cache entries, or the way that imports are
+# found, changes.
+_cache_version = 2
+
+_default_max_size = 64 * 1024 * 1024
+
+
+# Caches the imports found in each module file, validated using the file's
+# mtime and size, falling back to a hash of its contents. Imports found in
+# different ways, such as when tree shaking, are cached separately by passing
+# a different variant. Also caches how module names were resolved, per
+# sys.path, Python binary and the extension module suffixes that were
+# searched for, discarding the resolutions if any directory that was searched
+# has since been modified.
+class DependencyCache(object):
+    def __init__(self, cache_dir, sys_path, python_binary=None, extension_suffixes=()):
+        self._sys_path = sys_path
+        self._imports_dir = os.path.join(cache_dir, "imports")
+        self._resolutions_path = os.path.join(
+            cache_dir,
+            "resolutions",
+            _hash_json([_cache_version, sys_path, _file_identity(python_binary), list(extension_suffixes)]) + ".json",
+        )
+        self._file_states = {}
+        self._pending_import_lines = {}
+        self._resolutions = None
+        self._directories = None
+        self._resolutions_changed = False
+
+    def read_import_lines(self, module, variant=None):
+        key = _import_lines_key(module, variant)
+        entry_path = self._import_lines_path(key)
+        entry = _read_json(entry_path)
+
+        stat = os.stat(module.absolute_path)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            _touch(entry_path)
+            return entry["import_lines"]
+
+        content_hash = _hash_file(module.absolute_path)
+        self._file_states[key] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        if entry is not None and entry["hash"] == content_hash:
+            self._pending_import_lines[key] = entry["import_lines"]
+            return entry["import_lines"]
+
+        return None
+
+    def write_import_lines(self, module, import_lines, variant=None):
+        self._pending_import_lines[_import_lines_key(module, variant)] = import_lines
+
+    def resolved_module(self, module_name):
+        # Raises KeyError if module_name hasn't been resolved before
+        self._load_resolutions()
+        return self._resolutions[module_name]
+
+    def write_resolved_module(self, module_name, target):
+        self._load_resolutions()
+        self._resolutions[module_name] = target
+        self._resolutions_changed = True
+
+        parts = module_name.split(".")
+        for sys_path_entry in self._sys_path:
+            for directory_parts in (parts, parts[:-1]):
+                directory = _nearest_existing_directory(sys_path_entry, directory_parts)
+                if directory not in self._directories:
+                    self._directories[directory] = _mtime(directory)
+
+            if target is not None and target["absolute_path"].startswith(os.path.join(sys_path_entry, "")):
+                break
+
+    def save(self):
+        for key, import_lines in self._pending_import_lines.items():
+            mtime, size, content_hash = self._file_states[key]
+            _write_json(self._import_lines_path(key), {
+                "mtime": mtime,
+                "size": size,
+                "hash": content_hash,
+                "import_lines": import_lines,
+            })
+        self._pending_import_lines = {}
+
+        if self._resolutions_changed:
+            _write_json(self._resolutions_path, {
+                "directories": self._directories,
+                "modules": self._resolutions,
+            })
+            self._resolutions_changed = False
+
+    def _load_resolutions(self):
+        if self._resolutions is not None:
+            return
+
+        entry = _read_json(self._resolutions_path)
+        if entry is not None and all(
+            _mtime(directory) == mtime
+            for directory, mtime in entry["directories"].items()
+        ):
+            _touch(self._resolutions_path)
+            self._directories = entry["directories"]
+            self._resolutions = entry["modules"]
+        else:
+            self._directories = {}
+            self._resolutions = {}
+
+    def _import_lines_path(self, key):
+        return os.path.join(self._imports_dir, key[:2], key + ".json")
+
+
+# Removes the least recently used entries until the cache is no larger than
+# max_size. Since this walks the whole cache directory, it's done once after
+# bundling, rather than whenever entries are saved.
+def evict_cache(cache_dir, max_size=_default_max_size):
+    # Entries are touched whenever they're used, so removing the entries
+    # with the oldest mtimes first evicts the least recently used.
+    entries = []
+    for dir_path, dir_names, file_names in os.walk(cache_dir):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total_size = sum(size for mtime, size, path in entries)
+    for mtime, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+# Caches what was found by running a Python binary with a probe script, such
+# as its sys.path, since running a binary in a large virtualenv can be slow.
+# Entries are kept separately for each binary and probe, which is the probe
+# script and its arguments, and are discarded if the binary, the pyvenv.cfg of
+# its virtualenv, any directory on its sys.path, or any .pth file in those
+# directories, has since been modified.
+class InterpreterCache(object):
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+
+    def read_interpreter_info(self, python_binary, probe):
+        entry_path = self._entry_path(python_binary, probe)
+        entry = _read_json(entry_path)
+        if (
+            entry is not None and
+            entry["binary"] == _file_identity(python_binary) and
+            all(_mtime(path) == mtime for path, mtime in entry["files"].items())
+        ):
+            _touch(entry_path)
+            return entry["info"]
+        else:
+            return None
+
+    def write_interpreter_info(self, python_binary, probe, info):
+        binary = _file_identity(python_binary)
+        paths = _virtualenv_config_paths(python_binary)
+        for directory in info["sys_path"]:
+            paths.append(directory)
+            try:
+                file_names = os.listdir(directory)
+            except OSError:
+                continue
+            paths += [
+                os.path.join(directory, file_name)
+                for file_name in sorted(file_names)
+                if file_name.endswith(".pth")
+            ]
+
+        _write_json(self._entry_path(python_binary, probe), {
+            "binary": binary,
+            "files": dict((path, _mtime(path)) for path in paths),
+            "info": info,
+        })
+
+    def _entry_path(self, python_binary, probe):
+        # Virtualenvs often link to the same binary, so entries are also
+        # kept separately for where each binary's virtualenv is configured.
+        return os.path.join(
+            self._cache_dir,
+            "interpreters",
+            _hash_json([
+                _cache_version,
+                os.path.realpath(_binary_path(python_binary)),
+                _virtualenv_config_paths(python_binary),
+                probe,
+            ]) + ".json",
+        )
+
+
+def _virtualenv_config_paths(python_binary):
+    # The interpreter looks for pyvenv.cfg next to the binary, and in the
+    # directory above it, without following symlinks.
+    binary_directory = os.path.dirname(_binary_path(python_binary))
+    return [
+        os.path.join(binary_directory, "pyvenv.cfg"),
+        os.path.join(os.path.dirname(binary_directory), "pyvenv.cfg"),
+    ]
+
+
+def _import_lines_key(module, variant):
+    return _hash_json([
+        _cache_version,
+        os.path.abspath(module.absolute_path),
+        module.module_name,
+        module.is_package,
+        variant,
+    ])
+
+
+def _file_identity(path):
+    if path is None:
+        return None
+    else:
+        real_path = os.path.realpath(_binary_path(path))
+        stat = os.stat(real_path)
+        return [real_path, stat.st_mtime_ns, stat.st_size]
+
+
+def _binary_path(python_binary):
+    # Like subprocess, binaries without a directory, such as "python3", are
+    # found on PATH.
+    if not os.path.dirname(python_binary):
+        found_path = shutil.which(python_binary)
+        if found_path is not None:
+            return os.path.abspath(found_path)
+    return os.path.abspath(python_binary)
+
+
+def _nearest_existing_directory(root, parts):
+    # If a directory doesn't exist, then creating it will modify its parent,
+    # so we watch the nearest ancestor that does exist.
+    while parts and not os.path.isdir(os.path.join(root, *parts)):
+        parts = parts[:-1]
+    return os.path.join(root, *parts)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _hash_json(value):
+    return hashlib.sha256(json.dumps(value).encode("utf-8")).hexdigest()
+
+
+def _hash_file(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, value):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file and rename it so that concurrent bundling
+    # never sees a partially written entry.
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(value, file)
+        os.replace(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
@@ -0,0 +1,160 @@
+
+import contextlib as __stickytape_contextlib
+
+@__stickytape_contextlib.contextmanager
+def __stickytape_extraction_cache():
+    # Bundled files are extracted into a per-user cache directory named by
+    # the hash of the bundle, so later runs of the same bundle don't write
+    # anything. Files are extracted into a temporary directory that is then
+    # renamed, so concurrent first runs never see a partial extraction.
+    import os, os.path, shutil, sys, tempfile, time
+
+    max_age = 30 * 24 * 60 * 60
+    max_size = 256 * 1024 * 1024
+    temporary_prefix = ".tmp-"
+    # Names starting with __ would be mangled inside classes
+    write_bytecode_file = __stickytape_write_bytecode_file
+
+    class ExtractionCache(object):
+        def __init__(self, root):
+            self._root = root
+            self._working_dir = None
+            self.path = None
+
+        def open(self, bundle_hash):
+            self.path = os.path.join(self._root, bundle_hash)
+            if os.path.isdir(self.path):
+                # The directory's mtime records when it was last used
+                try:
+                    os.utime(self.path)
+                except OSError:
+                    pass
+            else:
+                if not os.path.isdir(self._root):
+                    os.makedirs(self._root, exist_ok=True)
+                self._working_dir = tempfile.mkdtemp(dir=self._root, prefix=temporary_prefix)
+
+        def write_module(self, path, contents):
+            if self._working_dir is None:
+                return
+
+            parts = path.split("/")
+            partial_path = self._working_dir
+            for part in parts[:-1]:
+                partial_path = os.path.join(partial_path, part)
+                if not os.path.exists(partial_path):
+                    os.mkdir(partial_path)
+                    with open(os.path.join(partial_path, "__init__.py"), "wb") as f:
+                        f.write(b"\n")
+
+            self._write(path, contents)
+
+        def write_data(self, path, contents):
+            if self._working_dir is None:
+                return
+
+            full_path = os.path.join(self._working_dir, path)
+            if not os.path.exists(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            self._write(path, contents)
+
+        def read_file(self, path):
+            if self._working_dir is None:
+                return None
+
+            with open(os.path.join(self._working_dir, path), "rb") as module_file:
+                return module_file.read()
+
+        def write_bytecode(self, path, bytecode):
+            if self._working_dir is None:
+                return
+
+            write_bytecode_file(os.path.join(self._working_dir, path), bytecode)
+
+        def finish(self):
+            if self._working_dir is not None:
+                try:
+                    os.rename(self._working_dir, self.path)
+                except OSError:
+                    # Another process extracted the same bundle first
+                    if not os.path.isdir(self.path):
+                        raise
+                    shutil.rmtree(self._working_dir, ignore_errors=True)
+                self._working_dir = None
+                self._evict()
+
+            sys.path.insert(0, self.path)
+
+        def abort(self):
+            if self._working_dir is not None:
+                shutil.rmtree(self._working_dir, ignore_errors=True)
+
+        def _write(self, path, contents):
+            with open(os.path.join(self._working_dir, path), "wb") as output_file:
+                output_file.write(contents)
+
+        def _evict(self):
+            # Removes entries that haven't been used for max_age, then the
+            # least recently used entries until the cache is smaller than
+            # max_size. Temporary directories left by interrupted
+            # extractions are removed after a day.
+            now = time.time()
+            entries = []
+            for name in os.listdir(self._root):
+                path = os.path.join(self._root, name)
+                if path == self.path:
+                    continue
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+
+                if name.startswith(temporary_prefix):
+                    if now - mtime > 24 * 60 * 60:
+                        shutil.rmtree(path, ignore_errors=True)
+                elif now - mtime > max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    entries.append((mtime, path))
+
+            total_size = _directory_size(self.path)
+            sizes = {}
+            for mtime, path in entries:
+                sizes[path] = _directory_size(path)
+                total_size += sizes[path]
+
+            for mtime, path in sorted(entries):
+                if total_size <= max_size:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total_size -= sizes[path]
+
+    def _directory_size(path):
+        size = 0
+        for dir_path, dir_names, file_names in os.walk(path):
+            for file_name in file_names:
+                try:
+                    size += os.path.getsize(os.path.join(dir_path, file_name))
+                except OSError:
+                    pass
+        return size
+
+    cache = ExtractionCache(__stickytape_cache_root())
+    try:
+        yield cache
+    except:
+        cache.abort()
+        raise
+
+with __stickytape_extraction_cache() as __stickytape_cache:
+    __stickytape_write_module = __stickytape_cache.write_module
+    __stickytape_write_data = __stickytape_cache.write_data
+    __stickytape_write_bytecode = __stickytape_cache.write_bytecode
+    __stickytape_read_file = __stickytape_cache.read_file
+
+    if __stickytape_profiler is not None:
+        __stickytape_profiler.install()
+        __stickytape_write_module = __stickytape_profiler.time_materialization(__stickytape_write_module)
+        __stickytape_write_data = __stickytape_profiler.time_materialization(__stickytape_write_data)
+        __stickytape_write_bytecode = __stickytape_profiler.time_materialization(__stickytape_write_bytecode)
+
@@ -0,0 +1,46 @@
+def __stickytape_cache_root():
+    # The per-user directory that the cache import mode extracts bundles
+    # into, and that extension modules are written to
+    import os, os.path, sys
+
+    if os.environ.get("STICKYTAPE_CACHE_DIR"):
+        return os.environ["STICKYTAPE_CACHE_DIR"]
+    elif sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+        return os.path.join(os.environ["LOCALAPPDATA"], "stickytape")
+    elif sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~"), "Library", "Caches", "stickytape")
+    else:
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(cache_home, "stickytape")
+
+def __stickytape_write_bytecode_file(source_path, bytecode):
+    # Always written to the __pycache__ directory next to the source:
+    # cache_from_source() returns a path under sys.pycache_prefix when it's
+    # set, which may not exist, and which wouldn't move along with the
+    # source when the cache import mode renames its directory.
+    import importlib.util, os, os.path, struct, sys
+
+    if bytecode[:4] != importlib.util.MAGIC_NUMBER:
+        return
+
+    cache_tag = sys.implementation.cache_tag
+    if cache_tag is None:
+        return
+
+    source_stat = os.stat(source_path)
+    header = struct.pack(
+        "<II",
+        int(source_stat.st_mtime) & 0xFFFFFFFF,
+        source_stat.st_size & 0xFFFFFFFF,
+    )
+    if sys.version_info >= (3, 7):
+        header = b"\0\0\0\0" + header
+
+    source_dir, source_name = os.path.split(source_path)
+    bytecode_dir = os.path.join(source_dir, "__pycache__")
+    if not os.path.exists(bytecode_dir):
+        os.mkdir(bytecode_dir)
+    bytecode_path = os.path.join(bytecode_dir, "{0}.{1}.pyc".format(os.path.splitext(source_name)[0], cache_tag))
+    with open(bytecode_path, "wb") as bytecode_file:
+        bytecode_file.write(bytecode[:4] + header + bytecode[4:])
+
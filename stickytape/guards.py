@@ -0,0 +1,139 @@
+import ast
+
+
+class StaticGuards(object):
+    # Evaluates conditions that can be decided before running on the target
+    # interpreter: TYPE_CHECKING, and comparisons involving
+    # sys.version_info, sys.platform and os.name.
+
+    def __init__(self, version_info, platform, os_name):
+        self._values = {
+            "sys.version_info": tuple(version_info),
+            "sys.version_info.major": version_info[0],
+            "sys.version_info.minor": version_info[1],
+            "sys.platform": platform,
+            "os.name": os_name,
+        }
+
+    def key(self):
+        # Identifies the environment that conditions are evaluated against
+        return tuple(sorted(self._values.items()))
+
+    def evaluate(self, node):
+        # Returns True or False if the condition is known, None otherwise
+        if isinstance(node, ast.BoolOp):
+            values = [self.evaluate(value) for value in node.values]
+            short_circuit = isinstance(node.op, ast.Or)
+            if short_circuit in values:
+                return short_circuit
+            elif None in values:
+                return None
+            else:
+                return not short_circuit
+
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            value = self.evaluate(node.operand)
+            return None if value is None else not value
+
+        elif _is_type_checking(node):
+            return False
+
+        elif isinstance(node, ast.Compare) and len(node.ops) == 1:
+            left = self._value(node.left)
+            right = self._value(node.comparators[0])
+            operator = _comparison_operators.get(type(node.ops[0]))
+            if left is _unknown or right is _unknown or operator is None:
+                return None
+            try:
+                return bool(operator(left, right))
+            except TypeError:
+                return None
+
+        elif (
+            isinstance(node, ast.Call) and
+            isinstance(node.func, ast.Attribute) and
+            node.func.attr in ("startswith", "endswith") and
+            len(node.args) == 1 and
+            not node.keywords
+        ):
+            value = self._value(node.func.value)
+            argument = self._value(node.args[0])
+            if isinstance(value, str) and isinstance(argument, (str, tuple)):
+                return getattr(value, node.func.attr)(argument)
+            else:
+                return None
+
+        else:
+            value = self._value(node)
+            if isinstance(value, bool):
+                return value
+            else:
+                return None
+
+    def _value(self, node):
+        name = _dotted_name(node)
+        if name in self._values:
+            return self._values[name]
+
+        if isinstance(node, ast.Subscript):
+            value = self._value(node.value)
+            index = self._index(node.slice)
+            if isinstance(value, tuple) and index is not _unknown:
+                try:
+                    return value[index]
+                except (IndexError, TypeError):
+                    return _unknown
+            else:
+                return _unknown
+
+        try:
+            return ast.literal_eval(node)
+        except ValueError:
+            return _unknown
+
+    def _index(self, node):
+        if isinstance(node, getattr(ast, "Index", ())):
+            node = node.value
+
+        if isinstance(node, ast.Slice):
+            parts = [
+                None if part is None else self._value(part)
+                for part in (node.lower, node.upper, node.step)
+            ]
+            if _unknown in parts:
+                return _unknown
+            else:
+                return slice(*parts)
+        else:
+            return self._value(node)
+
+
+_unknown = object()
+
+_comparison_operators = {
+    ast.Eq: lambda left, right: left == right,
+    ast.NotEq: lambda left, right: left != right,
+    ast.Lt: lambda left, right: left < right,
+    ast.LtE: lambda left, right: left <= right,
+    ast.Gt: lambda left, right: left > right,
+    ast.GtE: lambda left, right: left >= right,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+}
+
+
+def _is_type_checking(node):
+    return (
+        (isinstance(node, ast.Name) and node.id == "TYPE_CHECKING") or
+        (isinstance(node, ast.Attribute) and node.attr == "TYPE_CHECKING")
+    )
+
+
+def _dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Attribute):
+        value = _dotted_name(node.value)
+        return None if value is None else value + "." + node.attr
+    else:
+        return None
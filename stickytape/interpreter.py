@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+
+
+class InterpreterInfo(object):
+    def __init__(self, sys_path, version_info, platform, os_name, stdlib_module_names=None, extension_suffixes=()):
+        self.sys_path = sys_path
+        self.version_info = tuple(version_info)
+        self.platform = platform
+        self.os_name = os_name
+        self.stdlib_module_names = None if stdlib_module_names is None else frozenset(stdlib_module_names)
+        self.extension_suffixes = tuple(extension_suffixes)
+
+
+def read_interpreter_info(python_binary, cache=None, fields=()):
+    # Without an explicit binary, the current interpreter is the target, but
+    # its sys.path isn't searched for modules. When cache is set, what was
+    # read from the binary is reused between runs. Optional fields, such as
+    # stdlib_module_names, are only read when named in fields, since they can
+    # be slow to read.
+    fields = sorted(fields)
+    if python_binary is None:
+        info = _interpreter_info(fields)
+        info["sys_path"] = []
+    else:
+        probe = [_probe_source()] + fields
+        info = None if cache is None else cache.read_interpreter_info(python_binary, probe)
+        if info is None:
+            output = subprocess.check_output([python_binary, "-E", "-c"] + probe)
+            info = json.loads(output.decode("utf-8"))
+            if cache is not None:
+                cache.write_interpreter_info(python_binary, probe, info)
+
+    return InterpreterInfo(**info)
+
+
+def _interpreter_info(fields):
+    info = dict(
+        # The current directory is on sys.path when running with -c
+        sys_path=[path for path in sys.path if path],
+        version_info=list(sys.version_info),
+        platform=sys.platform,
+        os_name=os.name,
+    )
+    for field in fields:
+        info[field] = _optional_fields[field]()
+    return info
+
+
+def _stdlib_module_names():
+    # The top-level names of modules in the standard library
+    names = getattr(sys, "stdlib_module_names", None)
+    if names is not None:
+        return sorted(names)
+
+    # Before Python 3.10, list the modules in the standard library's
+    # directories instead. Directories without an __init__.py, such as
+    # site-packages, aren't listed as packages.
+    import pkgutil
+    import sysconfig
+
+    paths = sysconfig.get_paths()
+    stdlib_paths = [paths["stdlib"], paths["platstdlib"], os.path.join(paths["platstdlib"], "lib-dynload")]
+    names = set(sys.builtin_module_names)
+    names.update(module_info[1] for module_info in pkgutil.iter_modules(stdlib_paths))
+    return sorted(names)
+
+
+def _extension_suffixes():
+    # In the order that the interpreter tries them
+    try:
+        import importlib.machinery
+    except ImportError:
+        # Python 2
+        import imp
+        return [
+            suffix
+            for suffix, mode, module_type in imp.get_suffixes()
+            if module_type == imp.C_EXTENSION
+        ]
+    return list(importlib.machinery.EXTENSION_SUFFIXES)
+
+
+_optional_fields = {
+    "extension_suffixes": _extension_suffixes,
+    "stdlib_module_names": _stdlib_module_names,
+}
+
+
+def _probe_source():
+    with open(__file__, encoding="utf-8") as probe_file:
+        return probe_file.read()
+
+
+def _main():
+    # The optional fields to read are passed as arguments
+    sys.stdout.write(json.dumps(_interpreter_info(sys.argv[1:])))
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,19 +1,113 @@
 import argparse
+import json
+import os.path
 import sys
+import time
 
 import stickytape
 
 def main():
     args = _parse_args()
-    output_file = _open_output(args)
-    output = stickytape.script(
-        args.script,
+    if args.watch:
+        _watch(args)
+        return
+
+    if args.tree_shaking_report is None:
+        tree_shaking_report = None
+    else:
+        tree_shaking_report = stickytape.TreeShakingReport()
+
+    if args.report is None:
+        report = None
+    else:
+        report = stickytape.BundleReport()
+
+    if args.output_dir is not None:
+        stickytape.scripts(
+            args.scripts,
+            args.output_dir,
+            output_format=args.format,
+            options=args.options,
+            tree_shaking_report=tree_shaking_report,
+            report=report,
+        )
+    elif args.format == "zipapp":
+        if args.output_file is None:
+            output = stickytape.zipapp(args.scripts[0], options=args.options, tree_shaking_report=tree_shaking_report, report=report)
+            sys.stdout.buffer.write(output)
+        else:
+            with open(args.output_file, "wb") as output_file:
+                stickytape.zipapp_to_file(args.scripts[0], output_file, options=args.options, tree_shaking_report=tree_shaking_report, report=report)
+    else:
+        output_file = _open_output(args)
+        stickytape.script_to_file(
+            args.scripts[0],
+            output_file,
+            options=args.options,
+            tree_shaking_report=tree_shaking_report,
+            report=report,
+        )
+
+    if tree_shaking_report is not None:
+        with open(args.tree_shaking_report, "w", encoding="utf-8") as report_file:
+            json.dump(tree_shaking_report.to_json(), report_file, indent=4)
+
+    if report is not None:
+        with open(args.report, "w", encoding="utf-8") as report_file:
+            json.dump(report.to_json(), report_file, indent=4)
+        sys.stderr.write(report.summary())
+
+def _watch(args):
+    with stickytape.BundleWatcher(
+        args.scripts[0],
+        args.output_file,
+        output_format=args.format,
+        options=args.options,
+    ) as watcher:
+        watcher.build()
+        sys.stderr.write("Watching for changes to {0}\n".format(args.scripts[0]))
+        try:
+            while True:
+                time.sleep(_watch_interval)
+                start_time = time.perf_counter()
+                try:
+                    changed_paths = watcher.rebuild_if_changed()
+                except (SyntaxError, OSError) as error:
+                    sys.stderr.write("Failed to rebuild: {0}\n".format(error))
+                else:
+                    if changed_paths:
+                        sys.stderr.write("Rebuilt {0} in {1:.1f} ms ({2} changed)\n".format(
+                            args.output_file,
+                            (time.perf_counter() - start_time) * 1000,
+                            ", ".join(changed_paths),
+                        ))
+        except KeyboardInterrupt:
+            pass
+
+_watch_interval = 0.2
+
+def _bundle_options(args):
+    return stickytape.BundleOptions(
         add_python_modules=args.add_python_module,
         add_python_paths=args.add_python_path,
         python_binary=args.python_binary,
-        copy_shebang=args.copy_shebang
+        copy_shebang=args.copy_shebang,
+        package_data=_parse_package_data(args.add_package_data),
+        import_mode=args.import_mode,
+        precompile=args.precompile,
+        compression=args.compression,
+        cache_dir=args.cache_dir,
+        jobs=args.jobs,
+        io_threads=args.io_threads,
+        tree_shake=args.tree_shake,
+        use_interpreter_stdlib=args.use_interpreter_stdlib,
+        blob_store=args.blob_store,
+        minify=args.minify,
+        strip_annotations=args.strip_annotations,
+        preserve_line_numbers=args.preserve_line_numbers,
+        include_extensions=args.include_extensions,
+        deterministic=args.deterministic,
     )
-    output_file.write(output)
 
 def _open_output(args):
     if args.output_file is None:
@@ -21,16 +115,85 @@ def _open_output(args):
     else:
         return open(args.output_file, "w")
 
+def _parse_package_data(values):
+    # Each value is a package name and a glob pattern, separated by a colon
+    package_data = {}
+    for value in values:
+        package_name, _, pattern = value.partition(":")
+        package_data.setdefault(package_name, []).append(pattern)
+    return package_data
+
+def _read_manifest(path):
+    # One script per line, relative to the manifest. Blank lines and lines
+    # starting with "#" are ignored.
+    with open(path, encoding="utf-8") as manifest_file:
+        return [
+            os.path.join(os.path.dirname(path), line.strip())
+            for line in manifest_file
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
 def _parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("script")
+    parser.add_argument("scripts", metavar="script", nargs="*")
+    parser.add_argument("--manifest")
+    parser.add_argument("--output-dir")
     parser.add_argument("--add-python-module", action="append", default=[])
     parser.add_argument("--add-python-path", action="append", default=[])
+    parser.add_argument("--add-package-data", action="append", default=[], metavar="PACKAGE:PATTERN")
     parser.add_argument("--python-binary")
     parser.add_argument("--output-file")
     parser.add_argument("--copy-shebang", action="store_true")
-    return parser.parse_args()
+    parser.add_argument("--format", choices=["script", "zipapp"], default="script")
+    parser.add_argument("--import-mode", choices=["tempdir", "memory", "lazy", "cache"], default="tempdir")
+    parser.add_argument("--precompile", action="store_true")
+    parser.add_argument("--compression", choices=["zlib", "lzma"])
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--io-threads", type=int, default=4)
+    parser.add_argument("--tree-shake", action="store_true")
+    parser.add_argument("--use-interpreter-stdlib", action="store_true")
+    parser.add_argument("--blob-store")
+    parser.add_argument("--watch", action="store_true")
+    parser.add_argument("--minify", action="store_true")
+    parser.add_argument("--strip-annotations", action="store_true")
+    parser.add_argument("--preserve-line-numbers", action="store_true")
+    parser.add_argument("--include-extensions", action="store_true")
+    parser.add_argument("--deterministic", action="store_true")
+    parser.add_argument("--tree-shaking-report")
+    parser.add_argument("--report")
+    args = parser.parse_args()
+
+    if args.manifest is not None:
+        args.scripts += _read_manifest(args.manifest)
+
+    if args.output_dir is None:
+        if len(args.scripts) != 1:
+            parser.error("--output-dir is required unless bundling exactly one script")
+    else:
+        if args.output_file is not None:
+            parser.error("--output-file cannot be used with --output-dir")
+
+    for value in args.add_package_data:
+        if ":" not in value:
+            parser.error("--add-package-data must be of the form PACKAGE:PATTERN")
+
+    if args.watch:
+        if args.output_dir is not None or args.output_file is None:
+            parser.error("--watch requires --output-file")
+        if args.report is not None or args.tree_shaking_report is not None:
+            parser.error("--watch cannot be used with reports")
+
+    if args.tree_shaking_report is not None and not args.tree_shake:
+        parser.error("--tree-shaking-report requires --tree-shake")
+
+    args.options = _bundle_options(args)
+    try:
+        args.options.validate(args.format)
+    except ValueError as error:
+        parser.error(str(error))
+
+    return args
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,372 @@
+
+import contextlib as __stickytape_contextlib
+
+@__stickytape_contextlib.contextmanager
+def __stickytape_memory_importer():
+    import _imp
+    import importlib.abc
+    import importlib.machinery
+    import io
+    import importlib.util
+    import marshal
+    import os.path
+    import sys
+
+    fix_co_filename = getattr(_imp, "_fix_co_filename", None)
+    # Names starting with __ would be mangled inside classes
+    cache_root = __stickytape_cache_root
+
+    class MemoryImporter(importlib.abc.MetaPathFinder, importlib.abc.SourceLoader):
+        def __init__(self, root):
+            self._root = root
+            self._files = {}
+            self._compressed_files = {}
+            self._bytecode = {}
+            self._indexes = []
+            self._blob_stores = []
+            self._extensions = {}
+            # Directories that contain modules are packages, like in the
+            # tempdir import mode, while directories that only contain data
+            # files aren't.
+            self._packages = set()
+            self._directories = set()
+
+        def add_file(self, path, contents):
+            self._files[path] = contents
+            self._add_directories(path, self._packages)
+            self._add_directories(path, self._directories)
+
+        def add_data(self, path, contents):
+            self._files[path] = contents
+            self._add_directories(path, self._directories)
+
+        def add_compressed_file(self, path, contents):
+            # contents is base85 encoded zlib data, which is only
+            # decompressed when the file is read.
+            self._compressed_files[path] = contents
+            self._add_directories(path, self._directories)
+
+        def read_file(self, path):
+            return self._files[path]
+
+        def add_bytecode(self, path, bytecode):
+            self._bytecode[path] = bytecode
+
+        def add_index(self, files, bytecode, packages, directories, blob, compression):
+            self._indexes.append([files, bytecode, blob, compression])
+            self._packages.update(packages)
+            self._directories.update(directories)
+
+        def add_blob_store(self, root, files, bytecode, packages, directories):
+            # files and bytecode map paths to the hashes of their contents,
+            # which are read from root when they're first used.
+            self._blob_stores.append([files, bytecode, root])
+            self._packages.update(packages)
+            self._directories.update(directories)
+
+        def add_extensions(self, extensions):
+            # extensions maps module names to the path and hash of each
+            # extension module.
+            self._extensions.update(extensions)
+
+        def find_spec(self, fullname, path=None, target=None):
+            if fullname in self._extensions:
+                extension_path = self._extension_path(fullname)
+                return importlib.util.spec_from_file_location(
+                    fullname,
+                    extension_path,
+                    loader=importlib.machinery.ExtensionFileLoader(fullname, extension_path),
+                )
+
+            module_path = self._find_module_path(fullname)
+            if module_path is None:
+                return None
+
+            if self.is_package(fullname):
+                submodule_search_locations = [self._full_path(fullname.replace(".", "/"))]
+            else:
+                submodule_search_locations = None
+
+            return importlib.util.spec_from_file_location(
+                fullname,
+                self._full_path(module_path),
+                loader=self,
+                submodule_search_locations=submodule_search_locations,
+            )
+
+        def is_package(self, fullname):
+            return fullname.replace(".", "/") in self._packages
+
+        def get_filename(self, fullname):
+            module_path = self._find_module_path(fullname)
+            if module_path is None:
+                raise ImportError("No module named " + repr(fullname), name=fullname)
+            return self._full_path(module_path)
+
+        def get_code(self, fullname):
+            path = self.get_filename(fullname)
+            bytecode = self._read(self._bytecode, 1, self._relative_path(path))
+            if bytecode is not None and bytecode[:4] == importlib.util.MAGIC_NUMBER:
+                code = marshal.loads(bytecode[4:])
+                if fix_co_filename is not None:
+                    fix_co_filename(code, path)
+                return code
+            else:
+                return super().get_code(fullname)
+
+        def get_data(self, path):
+            relative_path = self._relative_path(path)
+            if relative_path is not None:
+                contents = self._read(self._files, 0, relative_path)
+                if contents is not None:
+                    return contents
+
+                if relative_path in self._compressed_files:
+                    import base64
+                    import zlib
+                    return zlib.decompress(base64.b85decode(self._compressed_files[relative_path]))
+
+                directory, _, name = relative_path.rpartition("/")
+                if name == "__init__.py" and directory in self._packages:
+                    return b"\n"
+
+            raise FileNotFoundError(path)
+
+        def get_resource_reader(self, fullname):
+            if self.is_package(fullname):
+                return MemoryResourceReader(MemoryTraversable(self, fullname.replace(".", "/")))
+            else:
+                return None
+
+        def path_hook(self, path):
+            # Finds the modules in the __path__ of bundled packages, so that
+            # pkgutil.iter_modules() can list them.
+            relative_path = self._relative_path(path)
+            if relative_path is None or relative_path not in self._packages:
+                raise ImportError("Not a bundled directory: " + repr(path), path=path)
+            return MemoryPathFinder(self, relative_path)
+
+        def iter_modules(self, relative_path, prefix=""):
+            modules = []
+            for name in self.list_directory(relative_path):
+                child_path = relative_path + "/" + name
+                if child_path in self._packages:
+                    modules.append((name, True))
+                elif name.endswith(".py") and name != "__init__.py":
+                    modules.append((name[:-len(".py")], False))
+            for fullname, (extension_path, content_hash) in self._extensions.items():
+                if extension_path.rpartition("/")[0] == relative_path:
+                    modules.append((fullname.rpartition(".")[2], False))
+            for name, is_package in sorted(set(modules)):
+                yield prefix + name, is_package
+
+        def list_directory(self, relative_path):
+            prefix = relative_path + "/"
+            paths = set(self._files) | set(self._compressed_files) | self._directories
+            for index in self._indexes + self._blob_stores:
+                paths.update(index[0])
+            return sorted(set(
+                path[len(prefix):].partition("/")[0]
+                for path in paths
+                if path.startswith(prefix)
+            ))
+
+        def _add_directories(self, path, directories):
+            directory = path.rpartition("/")[0]
+            while directory and directory not in directories:
+                directories.add(directory)
+                directory = directory.rpartition("/")[0]
+
+        def _extension_path(self, fullname):
+            # The dynamic loader can only load files, so extension modules in a
+            # blob store are loaded from the store. Otherwise, they're written
+            # to a directory named by their hash in the user's cache
+            # directory, which later runs, and other bundles, reuse.
+            relative_path, content_hash = self._extensions[fullname]
+            for blob_store in self._blob_stores:
+                if relative_path in blob_store[0]:
+                    return os.path.join(blob_store[2], content_hash[:2], content_hash)
+
+            directory = os.path.join(cache_root(), content_hash)
+            extension_path = os.path.join(directory, relative_path.rpartition("/")[2])
+            if os.path.exists(extension_path):
+                try:
+                    os.utime(directory)
+                except OSError:
+                    pass
+            else:
+                import tempfile
+                contents = self.get_data(self._full_path(relative_path))
+                os.makedirs(directory, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+                try:
+                    with os.fdopen(fd, "wb") as extension_file:
+                        extension_file.write(contents)
+                    os.chmod(temp_path, 0o755)
+                    os.replace(temp_path, extension_path)
+                except:
+                    os.remove(temp_path)
+                    raise
+            return extension_path
+
+        def _find_module_path(self, fullname):
+            relative_path = fullname.replace(".", "/")
+            if relative_path in self._packages:
+                return relative_path + "/__init__.py"
+            elif self._has_file(relative_path + ".py"):
+                return relative_path + ".py"
+            else:
+                return None
+
+        def _has_file(self, relative_path):
+            return relative_path in self._files or relative_path in self._compressed_files or any(
+                relative_path in index[0]
+                for index in self._indexes + self._blob_stores
+            )
+
+        def _read(self, contents, index_position, relative_path):
+            if relative_path in contents:
+                return contents[relative_path]
+
+            for index in self._indexes:
+                offsets = index[index_position]
+                if relative_path in offsets:
+                    start, end = offsets[relative_path]
+                    return self._decompressed_blob(index)[start:end]
+
+            for blob_store in self._blob_stores:
+                hashes = blob_store[index_position]
+                if relative_path in hashes:
+                    content_hash = hashes[relative_path]
+                    with open(os.path.join(blob_store[2], content_hash[:2], content_hash), "rb") as blob_file:
+                        return blob_file.read()
+
+            return None
+
+        def _decompressed_blob(self, index):
+            files, bytecode, blob, compression = index
+            if compression is not None:
+                import base64
+                blob = base64.b85decode(blob)
+                if compression == "zlib":
+                    import zlib
+                    blob = zlib.decompress(blob)
+                elif compression == "lzma":
+                    import lzma
+                    blob = lzma.decompress(blob)
+                else:
+                    raise ValueError("Unknown compression: " + repr(compression))
+                index[2:] = [blob, None]
+            return blob
+
+        def _full_path(self, relative_path):
+            return os.path.join(self._root, *relative_path.split("/"))
+
+        def _relative_path(self, path):
+            prefix = os.path.join(self._root, "")
+            if path.startswith(prefix):
+                return path[len(prefix):].replace(os.sep, "/")
+            else:
+                return None
+
+    class MemoryPathFinder(object):
+        def __init__(self, importer, relative_path):
+            self._importer = importer
+            self._relative_path = relative_path
+
+        def find_spec(self, fullname, target=None):
+            return self._importer.find_spec(fullname)
+
+        def invalidate_caches(self):
+            pass
+
+        def iter_modules(self, prefix=""):
+            return self._importer.iter_modules(self._relative_path, prefix)
+
+    class MemoryResourceReader(object):
+        # Supports importlib.resources.files(), as well as the older
+        # resource reader methods.
+        def __init__(self, root):
+            self._root = root
+
+        def files(self):
+            return self._root
+
+        def open_resource(self, resource):
+            return self._root.joinpath(resource).open("rb")
+
+        def resource_path(self, resource):
+            raise FileNotFoundError(resource)
+
+        def is_resource(self, name):
+            return self._root.joinpath(name).is_file()
+
+        def contents(self):
+            return [child.name for child in self._root.iterdir()]
+
+    class MemoryTraversable(object):
+        def __init__(self, importer, relative_path):
+            self._importer = importer
+            self._relative_path = relative_path
+            self.name = relative_path.rpartition("/")[2]
+
+        def iterdir(self):
+            for name in self._importer.list_directory(self._relative_path):
+                yield self.joinpath(name)
+
+        def is_dir(self):
+            return self._relative_path in self._importer._directories
+
+        def is_file(self):
+            return self._importer._has_file(self._relative_path)
+
+        def joinpath(self, *descendants):
+            parts = [self._relative_path]
+            for descendant in descendants:
+                parts += [part for part in str(descendant).split("/") if part]
+            return MemoryTraversable(self._importer, "/".join(parts))
+
+        __truediv__ = joinpath
+
+        def read_bytes(self):
+            return self._importer.get_data(self._importer._full_path(self._relative_path))
+
+        def read_text(self, encoding=None, errors=None):
+            with self.open("r", encoding=encoding, errors=errors) as text_file:
+                return text_file.read()
+
+        def open(self, mode="r", *args, **kwargs):
+            contents = io.BytesIO(self.read_bytes())
+            if "b" in mode:
+                return contents
+            else:
+                return io.TextIOWrapper(contents, *args, **kwargs)
+
+        def __str__(self):
+            return self._importer._full_path(self._relative_path)
+
+    root = os.path.abspath(globals().get("__file__", "stickytape"))
+    importer = MemoryImporter(root)
+    sys.meta_path.insert(0, importer)
+    sys.path_hooks.insert(0, importer.path_hook)
+    yield importer
+
+with __stickytape_memory_importer() as __stickytape_importer:
+    __stickytape_write_module = __stickytape_importer.add_file
+    __stickytape_write_data = __stickytape_importer.add_data
+    __stickytape_write_compressed_file = __stickytape_importer.add_compressed_file
+    __stickytape_write_bytecode = __stickytape_importer.add_bytecode
+    __stickytape_read_file = __stickytape_importer.read_file
+    __stickytape_add_module_index = __stickytape_importer.add_index
+    __stickytape_add_blob_store = __stickytape_importer.add_blob_store
+    __stickytape_add_extensions = __stickytape_importer.add_extensions
+
+    if __stickytape_profiler is not None:
+        __stickytape_profiler.install()
+        __stickytape_write_module = __stickytape_profiler.time_materialization(__stickytape_write_module)
+        __stickytape_write_data = __stickytape_profiler.time_materialization(__stickytape_write_data)
+        __stickytape_write_compressed_file = __stickytape_profiler.time_materialization(__stickytape_write_compressed_file)
+        __stickytape_write_bytecode = __stickytape_profiler.time_materialization(__stickytape_write_bytecode)
+        __stickytape_add_module_index = __stickytape_profiler.time_materialization(__stickytape_add_module_index)
+        __stickytape_add_blob_store = __stickytape_profiler.time_materialization(__stickytape_add_blob_store)
+        __stickytape_add_extensions = __stickytape_profiler.time_materialization(__stickytape_add_extensions)
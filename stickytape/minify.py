@@ -0,0 +1,256 @@
+import ast
+import bisect
+import io
+import re
+import sys
+import tokenize
+
+
+# Increment when the output of minification changes
+_minifier_version = 2
+
+
+# Removes docstrings and comments from module sources, and optionally
+# annotations. When preserving line numbers, removed lines are replaced with
+# blank lines, so that tracebacks point at the same lines as the original
+# source. Sources that can't be parsed are left as they are.
+class Minifier(object):
+    def __init__(self, strip_annotations=False, preserve_line_numbers=False):
+        if sys.version_info < (3, 8):
+            raise ValueError("Minification requires Python 3.8 or later")
+
+        self._strip_annotations = strip_annotations
+        self._preserve_line_numbers = preserve_line_numbers
+
+    def key(self):
+        # Identifies how sources are minified
+        return (_minifier_version, self._strip_annotations, self._preserve_line_numbers)
+
+    def minify(self, source):
+        # source and the result are bytes in the source's encoding
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(source).readline)
+        try:
+            text = source.decode(encoding)
+            tree = ast.parse(text)
+            tokens = list(tokenize.generate_tokens(io.StringIO(text).readline))
+        except (SyntaxError, UnicodeDecodeError, tokenize.TokenError):
+            return source
+
+        positions = _Positions(text)
+        removals = _find_comments(tokens, positions) + _find_docstrings(tree, positions)
+        if self._strip_annotations:
+            removals += _find_annotations(tree, tokens, positions)
+
+        result = self._remove(text, removals)
+        if not self._preserve_line_numbers:
+            result = _remove_blank_lines(result)
+
+        try:
+            ast.parse(result)
+        except SyntaxError:
+            return source
+        return result.encode(encoding)
+
+    def _remove(self, text, removals):
+        parts = []
+        offset = 0
+        for start, end, replacement, is_whole_lines in sorted(removals):
+            # Removals within a removal that has already been made, such as a
+            # comment inside a removed annotation, are skipped.
+            if start < offset:
+                continue
+
+            newlines = text.count("\n", start, end)
+            if self._preserve_line_numbers and newlines:
+                if is_whole_lines:
+                    replacement += "\n" * newlines
+                else:
+                    replacement += " \\\n" * newlines
+
+            parts.append(text[offset:start])
+            parts.append(replacement)
+            offset = end
+
+        parts.append(text[offset:])
+        return "".join(parts)
+
+
+class _Positions(object):
+    # Converts line numbers and columns into offsets in the source text. AST
+    # columns are offsets into the UTF-8 encoding of the line, while tokenize
+    # columns are offsets into the line's text.
+    def __init__(self, text):
+        self.text = text
+        self.lines = text.splitlines(True)
+        self._line_offsets = [0]
+        for line in self.lines:
+            self._line_offsets.append(self._line_offsets[-1] + len(line))
+
+    def of_token(self, position):
+        line, column = position
+        return self._line_offsets[line - 1] + column
+
+    def of_node_start(self, node):
+        return self._of_utf8(node.lineno, node.col_offset)
+
+    def of_node_end(self, node):
+        return self._of_utf8(node.end_lineno, node.end_col_offset)
+
+    def line_start(self, offset):
+        return self._line_offsets[self._line_index(offset)]
+
+    def line_end(self, offset):
+        return self._line_offsets[self._line_index(offset) + 1]
+
+    def _of_utf8(self, line, column):
+        text = self.lines[line - 1].encode("utf-8")[:column].decode("utf-8")
+        return self._line_offsets[line - 1] + len(text)
+
+    def _line_index(self, offset):
+        return bisect.bisect_right(self._line_offsets, offset) - 1
+
+
+def _find_comments(tokens, positions):
+    removals = []
+    for token in tokens:
+        if token.type == tokenize.COMMENT:
+            line_number = token.start[0]
+            if line_number <= 2 and _encoding_declaration.match(token.line):
+                continue
+
+            # Trailing whitespace before the comment is removed too
+            start = positions.of_token(token.start)
+            while start > 0 and token.line[:start - positions.line_start(start)].endswith((" ", "\t")):
+                start -= 1
+            removals.append((start, positions.of_token(token.end), "", False))
+    return removals
+
+
+_encoding_declaration = re.compile(r"^[ \t\f]*#.*?coding[:=]")
+
+
+def _find_docstrings(tree, positions):
+    removals = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and node.body:
+            statement = node.body[0]
+            if (
+                isinstance(statement, ast.Expr) and
+                isinstance(statement.value, ast.Constant) and
+                isinstance(statement.value.value, str)
+            ):
+                # A body can't be empty, so a docstring that's the only
+                # statement in a class or function is replaced with pass.
+                if len(node.body) == 1 and not isinstance(node, ast.Module):
+                    replacement = "pass"
+                else:
+                    replacement = ""
+                removals.append(_statement_removal(statement, positions, replacement))
+    return removals
+
+
+def _find_annotations(tree, tokens, positions):
+    tokens = _Tokens(tokens, positions)
+    removals = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            arguments = node.args
+            for argument in (
+                getattr(arguments, "posonlyargs", []) +
+                arguments.args +
+                [arguments.vararg] +
+                arguments.kwonlyargs +
+                [arguments.kwarg]
+            ):
+                if argument is not None and argument.annotation is not None:
+                    name_end = positions.of_node_start(argument) + len(argument.arg)
+                    removals.append(_annotation_removal(name_end, argument.annotation, tokens, positions))
+
+            if node.returns is not None:
+                start = positions.text.rindex("->", 0, positions.of_node_start(node.returns))
+                removals.append((start, _annotation_end(start, node.returns, tokens, positions), "", False))
+
+        elif isinstance(node, ast.AnnAssign):
+            if node.value is None:
+                removals.append(_statement_removal(node, positions, "pass"))
+            else:
+                removals.append(_annotation_removal(positions.of_node_end(node.target), node.annotation, tokens, positions))
+
+    return removals
+
+
+def _annotation_removal(target_end, annotation, tokens, positions):
+    # Removes the colon after the target, which may be followed by closing
+    # parentheses, and the annotation that follows it
+    start = positions.text.index(":", target_end)
+    return (start, _annotation_end(start, annotation, tokens, positions), "", False)
+
+
+def _annotation_end(start, annotation, tokens, positions):
+    # The annotation's node doesn't include any parentheses around it, so
+    # the closing parentheses that match opening parentheses between the
+    # colon or arrow and the annotation are removed too
+    end = positions.of_node_end(annotation)
+    unclosed = tokens.count_operators("(", start, positions.of_node_start(annotation))
+    for token_start, token_end, token in tokens.following(end):
+        if unclosed == 0:
+            break
+        elif token.type in (tokenize.COMMENT, tokenize.NL):
+            continue
+        elif token.type == tokenize.OP and token.string == ")":
+            end = token_end
+            unclosed -= 1
+        else:
+            break
+    return end
+
+
+class _Tokens(object):
+    def __init__(self, tokens, positions):
+        self._tokens = [
+            (positions.of_token(token.start), positions.of_token(token.end), token)
+            for token in tokens
+        ]
+        self._starts = [token_start for token_start, _, _ in self._tokens]
+
+    def count_operators(self, operator, start, end):
+        tokens = self._tokens[bisect.bisect_left(self._starts, start):bisect.bisect_left(self._starts, end)]
+        return sum(
+            1
+            for _, _, token in tokens
+            if token.type == tokenize.OP and token.string == operator
+        )
+
+    def following(self, offset):
+        return self._tokens[bisect.bisect_left(self._starts, offset):]
+
+
+def _statement_removal(statement, positions, replacement):
+    start = positions.of_node_start(statement)
+    end = positions.of_node_end(statement)
+    line_start = positions.line_start(start)
+    line_end = positions.line_end(end - 1)
+    before = positions.text[line_start:start]
+    after = positions.text[end:line_end]
+
+    # Remove whole lines when the statement is on lines of its own. Otherwise,
+    # the statement is replaced with pass, since it may be followed by a
+    # semicolon.
+    if not before.strip() and (not after.strip() or after.strip().startswith("#")) and not replacement:
+        return (line_start, line_end, "", True)
+    else:
+        return (start, end, replacement or "pass", False)
+
+
+def _remove_blank_lines(text):
+    # Lines inside multi-line strings are kept, even if they're blank.
+    string_lines = set()
+    for token in tokenize.generate_tokens(io.StringIO(text).readline):
+        if token.type == tokenize.STRING and token.start[0] != token.end[0]:
+            string_lines.update(range(token.start[0] + 1, token.end[0] + 1))
+
+    return "".join(
+        line
+        for line_number, line in enumerate(text.splitlines(True), 1)
+        if line.strip() or line_number in string_lines
+    )
@@ -0,0 +1,92 @@
+_output_formats = ("script", "zipapp")
+_import_modes = ("tempdir", "memory", "lazy", "cache")
+_compressions = ("zlib", "lzma")
+
+
+# How scripts are bundled, which is shared by every bundle written using the
+# same options. The output format isn't included, so that the same options can
+# be used to write scripts and zip apps.
+class BundleOptions(object):
+    def __init__(
+        self,
+        add_python_modules=None,
+        add_python_paths=None,
+        python_binary=None,
+        copy_shebang=False,
+        package_data=None,
+        import_mode="tempdir",
+        precompile=False,
+        compression=None,
+        cache_dir=None,
+        jobs=1,
+        io_threads=4,
+        tree_shake=False,
+        use_interpreter_stdlib=False,
+        blob_store=None,
+        minify=False,
+        strip_annotations=False,
+        preserve_line_numbers=False,
+        include_extensions=False,
+        deterministic=False,
+    ):
+        if add_python_modules is None:
+            add_python_modules = []
+
+        if add_python_paths is None:
+            add_python_paths = []
+
+        if package_data is None:
+            package_data = {}
+
+        self.add_python_modules = add_python_modules
+        self.add_python_paths = add_python_paths
+        self.python_binary = python_binary
+        self.copy_shebang = copy_shebang
+        self.package_data = package_data
+        self.import_mode = import_mode
+        self.precompile = precompile
+        self.compression = compression
+        self.cache_dir = cache_dir
+        self.jobs = jobs
+        self.io_threads = io_threads
+        self.tree_shake = tree_shake
+        self.use_interpreter_stdlib = use_interpreter_stdlib
+        self.blob_store = blob_store
+        self.minify = minify
+        self.strip_annotations = strip_annotations
+        self.preserve_line_numbers = preserve_line_numbers
+        self.include_extensions = include_extensions
+        self.deterministic = deterministic
+
+    def validate(self, output_format):
+        # Raises ValueError if the options can't be used together to write
+        # the given output format
+        if output_format not in _output_formats:
+            raise ValueError("Unknown output format: " + repr(output_format))
+
+        if self.import_mode not in _import_modes:
+            raise ValueError("Unknown import mode: " + repr(self.import_mode))
+
+        if self.compression is not None and self.compression not in _compressions:
+            raise ValueError("Unknown compression: " + repr(self.compression))
+
+        if (self.strip_annotations or self.preserve_line_numbers) and not self.minify:
+            raise ValueError("strip_annotations and preserve_line_numbers require minify")
+
+        if output_format == "zipapp":
+            if self.import_mode != "tempdir":
+                raise ValueError("Zip apps don't use an import mode")
+            if self.compression not in (None, "zlib"):
+                raise ValueError("Zip apps only support zlib compression")
+            if self.blob_store is not None:
+                raise ValueError("Zip apps can't use a blob store")
+            if self.include_extensions:
+                raise ValueError("Zip apps can't include extension modules")
+        else:
+            if self.compression is not None and self.import_mode != "lazy":
+                raise ValueError("Compression requires the lazy import mode")
+            if self.blob_store is not None:
+                if self.import_mode not in ("memory", "lazy"):
+                    raise ValueError("A blob store requires the memory or lazy import mode")
+                if self.compression is not None:
+                    raise ValueError("Compression can't be used with a blob store")
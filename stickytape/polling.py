@@ -0,0 +1,30 @@
+import os
+
+
+# Finds files and directories that have changed by comparing their mtime and
+# size with the last time that they were checked.
+class PollingWatcher(object):
+    def __init__(self):
+        self._states = {}
+
+    def watch(self, paths):
+        self._states = dict((path, _state(path)) for path in paths)
+
+    def refresh(self):
+        self.watch(list(self._states))
+
+    def changed_paths(self):
+        return sorted(
+            path
+            for path, state in self._states.items()
+            if _state(path) != state
+        )
+
+
+def _state(path):
+    try:
+        stat = os.stat(path or ".")
+    except OSError:
+        return None
+    else:
+        return (stat.st_mtime_ns, stat.st_size)
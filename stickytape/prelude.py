@@ -31,6 +31,32 @@ with __stickytape_temporary_dir() as __stickytape_working_dir:
         with open(full_path, "wb") as module_file:
             module_file.write(contents)
 
+    def __stickytape_write_data(path, contents):
+        import os, os.path
+
+        full_path = os.path.join(__stickytape_working_dir, path)
+        if not os.path.exists(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with open(full_path, "wb") as data_file:
+            data_file.write(contents)
+
+    def __stickytape_read_file(path):
+        import os.path
+
+        with open(os.path.join(__stickytape_working_dir, path), "rb") as module_file:
+            return module_file.read()
+
+    def __stickytape_write_bytecode(path, bytecode):
+        import os.path
+
+        __stickytape_write_bytecode_file(os.path.join(__stickytape_working_dir, path), bytecode)
+
     import sys as __stickytape_sys
     __stickytape_sys.path.insert(0, __stickytape_working_dir)
 
+    if __stickytape_profiler is not None:
+        __stickytape_profiler.install()
+        __stickytape_write_module = __stickytape_profiler.time_materialization(__stickytape_write_module)
+        __stickytape_write_data = __stickytape_profiler.time_materialization(__stickytape_write_data)
+        __stickytape_write_bytecode = __stickytape_profiler.time_materialization(__stickytape_write_bytecode)
+
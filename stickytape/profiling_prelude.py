@@ -0,0 +1,142 @@
+
+def __stickytape_create_profiler():
+    # When STICKYTAPE_PROFILE is set, time how long each bundled file takes to
+    # write, and how long each module takes to find, load and execute.
+    # Setting it to "-" writes a summary to stderr when the script exits,
+    # otherwise it is the path of a JSON report.
+    import os
+
+    destination = os.environ.get("STICKYTAPE_PROFILE")
+    if not destination:
+        return None
+
+    import atexit
+    import json
+    import sys
+    import time
+
+    class Profiler(object):
+        def __init__(self, destination):
+            self._destination = destination
+            self._materialization = []
+            self._modules = {}
+            self._stack = []
+
+        def install(self):
+            sys.meta_path.insert(0, self)
+            atexit.register(self.write_report)
+
+        def time_materialization(self, write):
+            def timed_write(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return write(*args, **kwargs)
+                finally:
+                    self._materialization.append({
+                        "path": args[0] if args else None,
+                        "time_us": _microseconds(time.perf_counter() - start),
+                    })
+            return timed_write
+
+        def find_spec(self, fullname, path=None, target=None):
+            self._modules.setdefault(fullname, {
+                "name": fullname,
+                "depth": len(self._stack),
+                "find": 0,
+                "load": 0,
+                "exec": 0,
+                "nested": 0,
+            })
+            spec = self._measure(fullname, "find", self._find_spec, fullname, path, target)
+            if spec is not None and spec.loader is not None and not isinstance(spec.loader, type):
+                self._instrument_loader(spec.loader)
+            return spec
+
+        def _find_spec(self, fullname, path, target):
+            for finder in sys.meta_path:
+                if finder is not self and hasattr(finder, "find_spec"):
+                    spec = finder.find_spec(fullname, path, target)
+                    if spec is not None:
+                        return spec
+            return None
+
+        def _instrument_loader(self, loader):
+            # Loaders may be shared between modules, so the loader's methods
+            # are replaced once, and find the module's name from their
+            # arguments.
+            if getattr(loader, "_stickytape_profiled", False):
+                return
+
+            try:
+                if hasattr(loader, "get_code"):
+                    get_code = loader.get_code
+                    loader.get_code = lambda fullname: self._measure(fullname, "load", get_code, fullname)
+                if hasattr(loader, "exec_module"):
+                    exec_module = loader.exec_module
+                    loader.exec_module = lambda module: self._measure(module.__name__, "exec", exec_module, module)
+                loader._stickytape_profiled = True
+            except AttributeError:
+                pass
+
+        def _measure(self, name, phase, func, *args):
+            if phase == "exec":
+                self._stack.append(name)
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                if phase == "exec":
+                    self._stack.pop()
+                if name in self._modules:
+                    self._modules[name][phase] += elapsed
+                # Time spent importing other modules doesn't count towards
+                # the time spent executing the importing module.
+                if self._stack and self._stack[-1] != name and self._stack[-1] in self._modules:
+                    self._modules[self._stack[-1]]["nested"] += elapsed
+
+        def report(self):
+            return {
+                "materialization": self._materialization,
+                "modules": [
+                    {
+                        "name": module["name"],
+                        "depth": module["depth"],
+                        "find_us": _microseconds(module["find"]),
+                        "load_us": _microseconds(module["load"]),
+                        "exec_us": _microseconds(module["exec"] - module["load"] - module["nested"]),
+                        "cumulative_us": _microseconds(module["find"] + module["exec"]),
+                    }
+                    for module in self._modules.values()
+                    if module["find"] or module["exec"]
+                ],
+            }
+
+        def write_report(self):
+            report = self.report()
+            if self._destination == "-":
+                write = sys.stderr.write
+                write("stickytape materialization: {0} us ({1} calls)\n".format(
+                    sum(entry["time_us"] for entry in report["materialization"]),
+                    len(report["materialization"]),
+                ))
+                write("stickytape import time: find [us] | load [us] | exec [us] | cumulative [us] | module\n")
+                for module in report["modules"]:
+                    write("stickytape import time: {0:>9} | {1:>9} | {2:>9} | {3:>15} | {4}{5}\n".format(
+                        module["find_us"],
+                        module["load_us"],
+                        module["exec_us"],
+                        module["cumulative_us"],
+                        "  " * module["depth"],
+                        module["name"],
+                    ))
+            else:
+                with open(self._destination, "w") as report_file:
+                    json.dump(report, report_file, indent=4)
+
+    def _microseconds(seconds):
+        return int(seconds * 1000000)
+
+    return Profiler(destination)
+
+__stickytape_profiler = __stickytape_create_profiler()
@@ -0,0 +1,2 @@
+# The same in both packages, so that it only needs to be written once
+message = "Hello"
@@ -0,0 +1,21 @@
+"""Greetings.
+
+A module with docstrings, comments and annotations.
+"""
+
+# The greeting to use
+_greeting: str = "Hello"  # Not "Hi"
+
+
+def message(name: str) -> str:
+    """Returns a greeting for name."""
+    # Comments inside strings aren't removed
+    return "{0}, {1} # not a comment".format(_greeting, name)
+
+
+class Greeter(object):
+    """Greets people."""
+
+
+def fail():
+    raise ValueError("line 21")
@@ -0,0 +1 @@
+message = "Exotic"
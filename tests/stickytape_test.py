@@ -1,14 +1,24 @@
+import ast
 import os
 import os.path
 import tempfile
 import contextlib
+import hashlib
+import importlib.machinery
+import importlib.util
+import io
+import json
 import platform
 import re
 import subprocess
 import shutil
 import sys
+import time
+
+import pytest
 
 import stickytape
+from stickytape.guards import StaticGuards
 from test_scripts import root as test_script_root
 
 
@@ -153,6 +163,39 @@ def test_module_import_is_detected_when_import_is_renamed():
     )
 
 
+def test_original_arguments_can_be_passed_positionally():
+    script_path = find_script("script_with_special_shebang/hello")
+    expected_result = stickytape.script(
+        script_path,
+        add_python_modules=[],
+        add_python_paths=[],
+        python_binary=sys.executable,
+        copy_shebang=True,
+    )
+
+    assert expected_result == stickytape.script(script_path, [], [], sys.executable, True)
+
+def test_options_can_be_passed_as_bundle_options():
+    script_path = find_script("script_with_special_shebang/hello")
+    options = stickytape.BundleOptions(copy_shebang=True, import_mode="lazy", compression="zlib")
+
+    expected_result = stickytape.script(script_path, copy_shebang=True, import_mode="lazy", compression="zlib")
+
+    assert expected_result == stickytape.script(script_path, options=options)
+    with pytest.raises(TypeError):
+        stickytape.script(script_path, options=options, import_mode="memory")
+
+def test_bundle_options_are_validated_for_output_format():
+    options = stickytape.BundleOptions(import_mode="lazy", compression="lzma")
+    options.validate("script")
+
+    with pytest.raises(ValueError, match="Zip apps don't use an import mode"):
+        options.validate("zipapp")
+    with pytest.raises(ValueError, match="Zip apps only support zlib compression"):
+        stickytape.zipapp(find_script("single_file/hello"), compression="lzma")
+    with pytest.raises(ValueError, match="Unknown output format"):
+        stickytape.scripts([], "output", output_format="egg")
+
 def test_can_explicitly_set_python_interpreter():
     with _temporary_directory() as temp_path:
         venv_path = os.path.join(temp_path, "venv")
@@ -224,6 +267,1254 @@ def test_additional_python_modules_can_be_explicitly_included():
     )
 
 
+def test_modules_can_use_file_and_read_package_data():
+    assert_script_output(
+        script_path="module_using_file_and_get_data/hello",
+        expected_output=b"True\nTrue\nmessage = \"Hello\"\n",
+    )
+
+
+def test_memory_import_mode_can_import_module_from_package():
+    assert_script_output(
+        script_path="script_using_module_in_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="memory",
+    )
+
+
+def test_memory_import_mode_resolves_explicit_relative_imports():
+    assert_script_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="memory",
+    )
+
+
+def test_memory_import_mode_handles_circular_references():
+    assert_script_output(
+        script_path="circular_reference/hello",
+        expected_output=b"Hello\n",
+        import_mode="memory",
+    )
+
+
+def test_memory_import_mode_supports_dynamic_imports_of_additional_modules():
+    assert_script_output(
+        script_path="script_with_dynamic_import/hello",
+        expected_output=b"Hello\n",
+        add_python_modules=("greeting", ),
+        import_mode="memory",
+    )
+
+
+def test_memory_import_mode_modules_can_use_file_and_read_package_data():
+    assert_script_output(
+        script_path="module_using_file_and_get_data/hello",
+        expected_output=b"True\nTrue\nmessage = \"Hello\"\n",
+        import_mode="memory",
+    )
+
+
+def test_lazy_import_mode_can_import_module_from_package():
+    assert_script_output(
+        script_path="script_using_module_in_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="lazy",
+    )
+
+
+def test_lazy_import_mode_resolves_explicit_relative_imports():
+    assert_script_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="lazy",
+    )
+
+
+def test_lazy_import_mode_supports_dynamic_imports_of_additional_modules():
+    assert_script_output(
+        script_path="script_with_dynamic_import/hello",
+        expected_output=b"Hello\n",
+        add_python_modules=("greeting", ),
+        import_mode="lazy",
+    )
+
+
+def test_lazy_import_mode_modules_can_use_file_and_read_package_data():
+    assert_script_output(
+        script_path="module_using_file_and_get_data/hello",
+        expected_output=b"True\nTrue\nmessage = \"Hello\"\n",
+        import_mode="lazy",
+    )
+
+
+def test_modules_in_bundled_packages_can_be_listed_using_pkgutil():
+    for import_mode in ("tempdir", "memory", "lazy"):
+        assert_script_output(
+            script_path="iter_modules/hello",
+            expected_output=(
+                b"[('first', False), ('nested', True), ('second', False)]\n"
+                b"['plugins.first', 'plugins.nested', 'plugins.nested.third', 'plugins.second']\n"
+            ),
+            import_mode=import_mode,
+        )
+
+def test_lazy_import_mode_works_without_any_modules():
+    assert_script_output(
+        script_path="single_file/hello",
+        expected_output=b"Hello\n",
+        import_mode="lazy",
+    )
+
+
+def test_precompiled_modules_can_be_imported_in_tempdir_import_mode():
+    assert_script_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+        precompile=True,
+    )
+
+
+def test_precompiled_modules_can_be_imported_when_pycache_prefix_is_set():
+    result = stickytape.script(
+        find_script("explicit_relative_import_from_parent_package/hello"),
+        precompile=True,
+    )
+
+    with _temporary_script(result) as output_path, _temporary_directory() as pycache_prefix:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=os.path.join(pycache_prefix, "missing"))
+        output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+        assert b"Hello\n" == output
+
+def test_precompiled_modules_can_be_imported_in_memory_import_mode():
+    assert_script_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="memory",
+        precompile=True,
+    )
+
+
+def test_precompiled_modules_can_be_imported_in_lazy_import_mode():
+    assert_script_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="lazy",
+        precompile=True,
+    )
+
+
+def test_precompiled_modules_have_file_set_to_bundled_path():
+    assert_script_output(
+        script_path="module_using_file_and_get_data/hello",
+        expected_output=b"True\nTrue\nmessage = \"Hello\"\n",
+        import_mode="memory",
+        precompile=True,
+    )
+
+
+def test_modules_can_be_precompiled_using_explicit_python_interpreter():
+    assert_script_output(
+        script_path="script_using_module_in_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="memory",
+        precompile=True,
+        python_binary=sys.executable,
+    )
+
+
+def test_source_is_used_when_magic_number_of_precompiled_module_does_not_match():
+    import importlib.util
+
+    result = stickytape.script(
+        find_script("script_using_module_in_package/hello"),
+        import_mode="memory",
+        precompile=True,
+    )
+    magic = repr(importlib.util.MAGIC_NUMBER)[2:-1]
+    result, count = re.subn(
+        r"(__stickytape_write_bytecode\([^,]*, b['\"])" + re.escape(magic),
+        r"\1\\x00\\x00\\x00\\x00",
+        result,
+    )
+    assert count == 1
+
+    _assert_output_of_bundled_script(result, b"Hello\n")
+
+
+def test_lazy_import_mode_can_use_zlib_compression():
+    assert_script_output(
+        script_path="module_using_file_and_get_data/hello",
+        expected_output=b"True\nTrue\nmessage = \"Hello\"\n",
+        import_mode="lazy",
+        compression="zlib",
+    )
+
+
+def test_lazy_import_mode_can_use_lzma_compression():
+    assert_script_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+        import_mode="lazy",
+        compression="lzma",
+        precompile=True,
+    )
+
+
+def test_compression_works_without_any_modules():
+    assert_script_output(
+        script_path="single_file/hello",
+        expected_output=b"Hello\n",
+        import_mode="lazy",
+        compression="zlib",
+    )
+
+
+def test_compression_requires_lazy_import_mode():
+    with pytest.raises(ValueError, match="Compression requires the lazy import mode"):
+        stickytape.script(find_script("single_file/hello"), compression="zlib")
+
+
+def test_zipapp_can_import_module_from_package():
+    assert_zipapp_output(
+        script_path="script_using_module_in_package/hello",
+        expected_output=b"Hello\n",
+    )
+
+
+def test_zipapp_resolves_explicit_relative_imports():
+    assert_zipapp_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+    )
+
+
+def test_zipapp_modules_can_use_file_and_read_package_data():
+    assert_zipapp_output(
+        script_path="module_using_file_and_get_data/hello",
+        expected_output=b"True\nTrue\nmessage = \"Hello\"\n",
+    )
+
+
+def test_zipapp_can_copy_shebang():
+    assert_zipapp_output(
+        script_path="script_with_special_shebang/hello",
+        expected_output=b"1\n",
+        copy_shebang=True,
+    )
+
+
+def test_zipapp_can_be_precompiled_and_compressed():
+    assert_zipapp_output(
+        script_path="explicit_relative_import_from_parent_package/hello",
+        expected_output=b"Hello\n",
+        precompile=True,
+        compression="zlib",
+    )
+
+
+def test_output_is_unchanged_when_using_dependency_cache():
+    with _temporary_directory() as cache_dir:
+        script_path = find_script("explicit_relative_import_from_parent_package/hello")
+        expected_result = stickytape.script(script_path)
+
+        assert expected_result == stickytape.script(script_path, cache_dir=cache_dir)
+        assert expected_result == stickytape.script(script_path, cache_dir=cache_dir)
+
+
+def test_python_binary_can_be_found_on_path_when_using_dependency_cache(monkeypatch):
+    monkeypatch.setenv("PATH", os.path.dirname(sys.executable) + os.pathsep + os.environ.get("PATH", ""))
+    python_binary = os.path.basename(sys.executable)
+    script_path = find_script("explicit_relative_import_from_parent_package/hello")
+    expected_result = stickytape.script(script_path, python_binary=python_binary)
+
+    with _temporary_directory() as cache_dir, _temporary_directory() as working_dir:
+        monkeypatch.chdir(working_dir)
+        assert expected_result == stickytape.script(script_path, python_binary=python_binary, cache_dir=cache_dir)
+        assert expected_result == stickytape.script(script_path, python_binary=python_binary, cache_dir=cache_dir)
+
+def test_modified_modules_are_reparsed_when_using_dependency_cache():
+    with _temporary_directory() as temp_path:
+        cache_dir = os.path.join(temp_path, "cache")
+        script_dir = os.path.join(temp_path, "script")
+        shutil.copytree(find_script("script_with_single_local_import"), script_dir)
+        script_path = os.path.join(script_dir, "hello")
+        stickytape.script(script_path, cache_dir=cache_dir)
+
+        with open(os.path.join(script_dir, "message.py"), "w") as message_file:
+            message_file.write("message = 'Hello from message'\n")
+        with open(os.path.join(script_dir, "greeting.py"), "w") as greeting_file:
+            greeting_file.write("from message import message\n")
+
+        result = stickytape.script(script_path, cache_dir=cache_dir)
+        _assert_output_of_bundled_script(result, b"Hello from message\n")
+
+
+def test_new_modules_are_found_when_using_dependency_cache():
+    with _temporary_directory() as temp_path:
+        cache_dir = os.path.join(temp_path, "cache")
+        script_dir = os.path.join(temp_path, "script")
+        shutil.copytree(find_script("script_using_module_in_package"), script_dir)
+        script_path = os.path.join(script_dir, "hello")
+        stickytape.script(script_path, cache_dir=cache_dir)
+
+        with open(os.path.join(script_dir, "greetings", "__init__.py"), "w") as init_file:
+            init_file.write("print('Initialising greetings')\n")
+
+        result = stickytape.script(script_path, cache_dir=cache_dir)
+        _assert_output_of_bundled_script(result, b"Initialising greetings\nHello\n")
+
+
+def test_output_is_unchanged_when_parsing_modules_in_parallel():
+    for script_path in ["explicit_relative_import_from_parent_package/hello", "circular_reference/hello"]:
+        expected_result = stickytape.script(find_script(script_path))
+        assert expected_result == stickytape.script(find_script(script_path), jobs=2)
+
+
+def test_additional_python_modules_are_included_when_parsing_modules_in_parallel():
+    assert_script_output(
+        script_path="script_with_dynamic_import/hello",
+        expected_output=b"Hello\n",
+        add_python_modules=("greeting", ),
+        jobs=2,
+    )
+
+
+def test_parallel_parsing_can_use_dependency_cache():
+    with _temporary_directory() as cache_dir:
+        script_path = find_script("imports_in_imported_modules/hello")
+        expected_result = stickytape.script(script_path)
+
+        assert expected_result == stickytape.script(script_path, cache_dir=cache_dir, jobs=2)
+        assert expected_result == stickytape.script(script_path, cache_dir=cache_dir, jobs=2)
+
+
+def test_dependency_cache_is_evicted_once_per_analysis(monkeypatch):
+    evicted_cache_dirs = []
+    evict_cache = stickytape.evict_cache
+
+    def record_eviction(cache_dir):
+        evicted_cache_dirs.append(cache_dir)
+        evict_cache(cache_dir)
+
+    monkeypatch.setattr(stickytape, "evict_cache", record_eviction)
+    script_paths = [
+        find_script("duplicate_modules/hello"),
+        find_script("duplicate_modules/hello_again"),
+    ]
+    with _temporary_directory() as cache_dir, _temporary_directory() as output_dir:
+        stickytape.scripts(script_paths, output_dir, cache_dir=cache_dir, jobs=2)
+
+        assert evicted_cache_dirs == [cache_dir]
+
+
+def test_script_in_current_directory_can_be_converted():
+    original_cwd = os.getcwd()
+    os.chdir(find_script("script_using_module_in_package"))
+    try:
+        result = stickytape.script("hello")
+    finally:
+        os.chdir(original_cwd)
+
+    _assert_output_of_bundled_script(result, b"Hello\n")
+
+
+def test_module_resolver_lists_each_directory_at_most_once():
+    script_dir = find_script("explicit_relative_import_from_parent_package")
+    resolver = stickytape.ModuleResolver([script_dir, os.path.join(script_dir, "greetings")])
+
+    for _ in range(2):
+        assert resolver.find_module("greetings.greeting").relative_path == "greetings/greeting/__init__.py"
+        assert resolver.find_module("greetings.messages").relative_path == "greetings/messages.py"
+        assert resolver.find_module("greetings.missing") is None
+
+    assert resolver.filesystem_calls == 4
+    assert resolver.filesystem_calls_saved == 10
+
+
+def test_many_scripts_can_be_bundled_into_output_directory():
+    script_paths = [
+        find_script("script_using_module_in_package/hello"),
+        find_script("explicit_relative_import/hello"),
+    ]
+    with _temporary_directory() as output_dir:
+        with pytest.raises(ValueError, match="Scripts must have distinct filenames"):
+            stickytape.scripts(script_paths, output_dir)
+
+        renamed_script_path = os.path.join(output_dir, "hello-explicit-relative-import")
+        shutil.copy(script_paths[1], renamed_script_path)
+        shutil.copytree(
+            os.path.join(os.path.dirname(script_paths[1]), "greetings"),
+            os.path.join(output_dir, "greetings"),
+        )
+        script_paths[1] = renamed_script_path
+
+        bundle_dir = os.path.join(output_dir, "bundles")
+        os.mkdir(bundle_dir)
+        output_paths = stickytape.scripts(script_paths, bundle_dir, import_mode="lazy", jobs=2)
+
+        assert output_paths == [
+            os.path.join(bundle_dir, "hello"),
+            os.path.join(bundle_dir, "hello-explicit-relative-import"),
+        ]
+        for script_path, output_path in zip(script_paths, output_paths):
+            with open(output_path, encoding="utf-8") as output_file:
+                assert stickytape.script(script_path, import_mode="lazy") == output_file.read()
+
+
+def test_many_scripts_can_be_written_in_parallel():
+    script_paths = [
+        find_script("duplicate_modules/hello"),
+        find_script("duplicate_modules/hello_again"),
+        find_script("package_data/read_resources"),
+    ]
+    results = []
+    for jobs in (1, 3):
+        with _temporary_directory() as output_dir:
+            report = stickytape.BundleReport()
+            output_paths = stickytape.scripts(script_paths, output_dir, import_mode="memory", jobs=jobs, report=report)
+            outputs = []
+            for output_path in output_paths:
+                with open(output_path, encoding="utf-8") as output_file:
+                    outputs.append(output_file.read())
+            modules = [(module["script"], module["module"]) for module in report.modules]
+            results.append((outputs, modules))
+
+    assert results[0] == results[1]
+
+def test_many_scripts_can_be_bundled_as_zipapps_using_command_line():
+    with _temporary_directory() as output_dir:
+        manifest_path = os.path.join(output_dir, "manifest")
+        with open(manifest_path, "w") as manifest_file:
+            manifest_file.write("# Scripts\n\n")
+            manifest_file.write(find_script("script_using_module_in_package/hello") + "\n")
+
+        subprocess.run(
+            [
+                sys.executable, "-m", "stickytape.main",
+                "--manifest", manifest_path,
+                "--output-dir", output_dir,
+                "--format", "zipapp",
+            ],
+            check=True,
+        )
+
+        with open(os.path.join(output_dir, "hello"), "rb") as output_file:
+            _assert_output_of_bundled_script(output_file.read(), b"Hello\n")
+
+
+def test_imports_in_unreachable_branches_are_bundled_by_default():
+    assert_script_output(
+        script_path="script_with_static_guards/hello",
+        expected_output=b"Hello\n",
+        expected_modules=["type_hints", "helpers", "legacy", "exotic", "greeting"],
+    )
+
+
+def test_imports_in_unreachable_branches_are_not_bundled_when_tree_shaking():
+    assert_script_output(
+        script_path="script_with_static_guards/hello",
+        expected_output=b"Hello\n",
+        expected_modules=["greeting"],
+        tree_shake=True,
+    )
+
+
+def test_tree_shaking_report_includes_pruned_imports_and_modules():
+    script_path = find_script("script_with_static_guards/hello")
+    report = stickytape.TreeShakingReport()
+    stickytape.script(script_path, tree_shake=True, tree_shaking_report=report)
+
+    assert [
+        (pruned_import["module"], pruned_import["guard"])
+        for pruned_import in report.pruned_imports
+    ] == [
+        ("type_hints", "line 7: if TYPE_CHECKING:"),
+        ("legacy", "line 10: if sys.version_info < (3, ):"),
+        ("exotic", 'line 12: elif sys.platform == "stickytape-test-platform" or os.name == "stickytape-test-os":'),
+    ]
+    assert [module["module"] for module in report.pruned_modules] == ["type_hints", "helpers", "legacy", "exotic"]
+    assert report.bytes_saved == sum(
+        os.path.getsize(os.path.join(os.path.dirname(script_path), module["path"]))
+        for module in report.pruned_modules
+    )
+
+
+def test_tree_shaking_can_use_dependency_cache():
+    with _temporary_directory() as cache_dir:
+        script_path = find_script("script_with_static_guards/hello")
+        expected_result = stickytape.script(script_path, tree_shake=True)
+
+        assert expected_result == stickytape.script(script_path, cache_dir=cache_dir, tree_shake=True)
+        assert expected_result == stickytape.script(script_path, cache_dir=cache_dir, tree_shake=True)
+        assert stickytape.script(script_path) == stickytape.script(script_path, cache_dir=cache_dir)
+
+
+def test_static_guards_are_evaluated_against_target_interpreter():
+    guards = StaticGuards(version_info=(3, 8, 1, "final", 0), platform="linux", os_name="posix")
+
+    def evaluate(condition):
+        return guards.evaluate(ast.parse(condition).body[0].value)
+
+    assert evaluate("sys.version_info >= (3, 6)") is True
+    assert evaluate("sys.version_info[:2] == (3, 7)") is False
+    assert evaluate("sys.version_info.major == 2") is False
+    assert evaluate("sys.version_info[0] >= 3 and sys.version_info[1] >= 8") is True
+    assert evaluate("sys.platform.startswith(('win', 'cygwin'))") is False
+    assert evaluate("sys.platform != 'win32' or unknown") is True
+    assert evaluate("os.name == 'nt' and unknown") is False
+    assert evaluate("not typing.TYPE_CHECKING") is True
+    assert evaluate("os.name == 'posix' and unknown") is None
+    assert evaluate("version_info >= (3, 6)") is None
+
+
+def test_script_can_be_written_directly_to_file():
+    script_path = find_script("explicit_relative_import_from_parent_package/hello")
+    for import_mode in ("tempdir", "lazy"):
+        output = io.StringIO()
+        stickytape.script_to_file(script_path, output, import_mode=import_mode)
+        assert stickytape.script(script_path, import_mode=import_mode) == output.getvalue()
+
+
+def test_zipapp_can_be_written_directly_to_file():
+    script_path = find_script("explicit_relative_import_from_parent_package/hello")
+    output = io.BytesIO()
+    stickytape.zipapp_to_file(script_path, output)
+    assert stickytape.zipapp(script_path) == output.getvalue()
+
+
+def test_compressed_blob_can_span_many_lines():
+    with _temporary_directory() as script_dir:
+        script_path = os.path.join(script_dir, "hello")
+        with open(script_path, "w") as script_file:
+            script_file.write("import greeting\nprint(greeting.message)\n")
+        with open(os.path.join(script_dir, "greeting.py"), "w") as greeting_file:
+            greeting_file.write("# {0}\nmessage = 'Hello'\n".format(os.urandom(4096).hex()))
+
+        for compression in ("zlib", "lzma"):
+            result = stickytape.script(script_path, import_mode="lazy", compression=compression)
+            _assert_output_of_bundled_script(result, b"Hello\n")
+
+
+def test_package_data_can_be_read_using_get_data():
+    for import_mode in ("tempdir", "memory", "lazy"):
+        assert_script_output(
+            script_path="package_data/hello",
+            expected_output=b"Hello\n",
+            package_data={"greetings": ["templates/*.txt"]},
+            import_mode=import_mode,
+        )
+
+
+def test_directories_containing_only_package_data_are_not_packages():
+    for import_mode in ("tempdir", "memory", "lazy"):
+        assert_script_output(
+            script_path="package_data/list_modules",
+            expected_output=b"[]\n",
+            package_data={"greetings": ["templates/*.txt"]},
+            import_mode=import_mode,
+        )
+
+    with _temporary_directory() as blob_store:
+        assert_script_output(
+            script_path="package_data/list_modules",
+            expected_output=b"[]\n",
+            package_data={"greetings": ["templates/*.txt"]},
+            import_mode="memory",
+            blob_store=blob_store,
+        )
+
+
+def test_zipapp_package_data_can_be_read_using_get_data():
+    assert_zipapp_output(
+        script_path="package_data/hello",
+        expected_output=b"Hello\n",
+        package_data={"greetings": ["templates/*.txt"]},
+    )
+
+
+# Before Python 3.10, importlib.resources.files() ignores the loader's
+# resource reader, and only works for packages on the filesystem.
+_requires_importlib_resources_files = pytest.mark.skipif(
+    sys.version_info < (3, 10),
+    reason="importlib.resources.files() uses resource readers from Python 3.10",
+)
+
+
+@_requires_importlib_resources_files
+def test_package_data_can_be_read_using_importlib_resources():
+    for import_mode in ("tempdir", "memory", "lazy"):
+        assert_script_output(
+            script_path="package_data/read_resources",
+            expected_output=b"Hello\n['farewell.txt', 'message.txt']\n",
+            package_data={"greetings": ["templates/*.txt"]},
+            import_mode=import_mode,
+        )
+
+
+@_requires_importlib_resources_files
+def test_zipapp_package_data_can_be_read_using_importlib_resources():
+    assert_zipapp_output(
+        script_path="package_data/read_resources",
+        expected_output=b"Hello\n['farewell.txt', 'message.txt']\n",
+        package_data={"greetings": ["templates/*.txt"]},
+    )
+
+
+def test_large_package_data_is_compressed_separately():
+    with _temporary_directory() as script_dir:
+        script_path = os.path.join(script_dir, "hello")
+        with open(script_path, "w") as script_file:
+            script_file.write(
+                "import hashlib, pkgutil\n"
+                "print(hashlib.sha1(pkgutil.get_data('greetings', 'data/large.bin')).hexdigest())\n"
+            )
+        os.makedirs(os.path.join(script_dir, "greetings", "data"))
+        with open(os.path.join(script_dir, "greetings", "__init__.py"), "w"):
+            pass
+        large_data = b"Hello\n" * 100000
+        with open(os.path.join(script_dir, "greetings", "data", "large.bin"), "wb") as data_file:
+            data_file.write(large_data)
+
+        expected_output = (hashlib.sha1(large_data).hexdigest() + "\n").encode("ascii")
+        for import_mode, compression in [("memory", None), ("lazy", None), ("lazy", "zlib")]:
+            result = stickytape.script(
+                script_path,
+                package_data={"greetings": ["data/*"]},
+                import_mode=import_mode,
+                compression=compression,
+            )
+            assert "__stickytape_write_compressed_file(" in result
+            assert len(result) < len(large_data) // 10
+            _assert_output_of_bundled_script(result, expected_output)
+
+
+def test_import_times_are_reported_when_profiling_is_enabled():
+    script_path = find_script("explicit_relative_import_from_parent_package/hello")
+    for import_mode in ("tempdir", "memory", "lazy"):
+        result = stickytape.script(script_path, import_mode=import_mode)
+        with _temporary_script(result) as output_path, _temporary_directory() as report_dir:
+            report_path = os.path.join(report_dir, "report.json")
+            env = dict(os.environ, STICKYTAPE_PROFILE=report_path)
+            output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+            assert b"Hello\n" == output
+
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+
+        assert len(report["materialization"]) > 0
+        modules = dict((module["name"], module) for module in report["modules"])
+        assert modules["greetings.messages"]["depth"] == modules["greetings.greeting"]["depth"] + 1
+        assert set(modules["greetings.messages"]) == set(["name", "depth", "find_us", "load_us", "exec_us", "cumulative_us"])
+
+
+def test_bundle_report_includes_sizes_and_inclusion_chains():
+    script_path = find_script("script_with_static_guards/hello")
+    for import_mode in ("tempdir", "memory", "lazy"):
+        report = stickytape.BundleReport()
+        result = stickytape.script(script_path, import_mode=import_mode, report=report)
+
+        modules = dict((module["module"], module) for module in report.modules)
+        assert set(modules) == set(["greeting", "type_hints", "helpers", "legacy", "exotic"])
+        assert modules["helpers"]["included_by"] == [script_path, "type_hints"]
+        assert modules["helpers"]["raw_size"] == os.path.getsize(
+            os.path.join(os.path.dirname(script_path), "helpers.py")
+        )
+        assert modules["helpers"]["discovery_time"] >= 0
+        assert all(module["output_size"] > module["raw_size"] for module in report.modules)
+        assert report.to_json()["total_output_size"] < len(result)
+
+
+def test_bundle_report_output_sizes_are_unknown_for_compressed_modules():
+    script_path = find_script("script_with_static_guards/hello")
+    report = stickytape.BundleReport()
+    stickytape.script(script_path, import_mode="lazy", compression="zlib", report=report)
+
+    assert all(module["output_size"] is None for module in report.modules)
+    assert report.to_json()["total_output_size"] is None
+    assert "bytes of output" in report.summary()
+
+
+def test_bundle_report_includes_package_data_and_zipapp_entries():
+    script_path = find_script("package_data/hello")
+    report = stickytape.BundleReport()
+    stickytape.zipapp(
+        script_path,
+        package_data={"greetings": ["templates/*.txt"]},
+        report=report,
+    )
+
+    assert [data_file["path"] for data_file in report.data_files] == [
+        "greetings/templates/farewell.txt",
+        "greetings/templates/message.txt",
+    ]
+    assert [module["module"] for module in report.modules] == ["greetings"]
+    assert report.modules[0]["included_by"] == [script_path]
+    assert all(entry["output_size"] == entry["raw_size"] for entry in report.modules + report.data_files)
+
+
+def test_stdlib_submodules_are_not_bundled_when_using_interpreter_stdlib():
+    with _temporary_directory() as script_dir:
+        script_path = os.path.join(script_dir, "hello")
+        with open(script_path, "w") as script_file:
+            script_file.write("import email.mime.text\nimport xml.etree.ElementTree\nprint('Hello')\n")
+
+        report = stickytape.BundleReport()
+        result = stickytape.script(
+            script_path,
+            python_binary=sys.executable,
+            use_interpreter_stdlib=True,
+            report=report,
+        )
+
+    assert report.modules == []
+    _assert_output_of_bundled_script(result, b"Hello\n")
+
+
+def test_local_modules_are_bundled_when_using_interpreter_stdlib():
+    assert_script_output(
+        script_path="script_using_stdlib_module_in_package/hello",
+        expected_output=b"xml.etree.ElementTree\nHello\n",
+        expected_modules=["greeting"],
+        python_binary=sys.executable,
+        use_interpreter_stdlib=True,
+    )
+
+
+def test_stdlib_module_names_are_found_without_sys_stdlib_module_names(monkeypatch):
+    if hasattr(sys, "stdlib_module_names"):
+        monkeypatch.delattr(sys, "stdlib_module_names")
+
+    names = set(stickytape.interpreter._stdlib_module_names())
+
+    assert set(["os", "json", "xml", "email", "sys"]) <= names
+    assert "pytest" not in names
+
+
+def test_files_with_the_same_contents_are_only_written_once():
+    for import_mode in ("tempdir", "memory", "lazy"):
+        result = stickytape.script(find_script("duplicate_modules/hello"), import_mode=import_mode)
+
+        assert result.count("message = \"Hello\"") == 1
+        _assert_output_of_bundled_script(result, b"Hello\nHello\n")
+
+
+def test_duplicate_files_are_written_again_when_shorter_than_a_reference():
+    for import_mode in ("tempdir", "memory"):
+        result = stickytape.script(find_script("duplicate_modules/hello"), import_mode=import_mode)
+
+        assert "__stickytape_read_file('first/__init__.py')" not in result
+        assert "__stickytape_write_module('second/__init__.py', b'')" in result
+        _assert_output_of_bundled_script(result, b"Hello\nHello\n")
+
+def test_bundles_can_share_files_using_blob_store():
+    script_paths = [find_script("duplicate_modules/hello"), find_script("duplicate_modules/hello_again")]
+    with _temporary_directory() as output_dir, _temporary_directory() as blob_store:
+        output_paths = stickytape.scripts(
+            script_paths,
+            output_dir,
+            import_mode="lazy",
+            blob_store=blob_store,
+        )
+
+        blob_names = [
+            file_name
+            for dir_path, dir_names, file_names in os.walk(blob_store)
+            for file_name in file_names
+        ]
+        assert len(blob_names) == 2
+
+        for output_path, expected_output in zip(output_paths, [b"Hello\nHello\n", b"Hello\n"]):
+            with open(output_path) as output_file:
+                assert "message = " not in output_file.read()
+            output = subprocess.run([sys.executable, output_path], stdout=subprocess.PIPE, check=True).stdout
+            assert expected_output == output
+
+
+def test_package_data_can_be_read_from_blob_store():
+    with _temporary_directory() as blob_store:
+        assert_script_output(
+            script_path="package_data/hello",
+            expected_output=b"Hello\n",
+            package_data={"greetings": ["templates/*.txt"]},
+            import_mode="memory",
+            blob_store=blob_store,
+        )
+
+
+@_requires_importlib_resources_files
+def test_package_data_can_be_read_from_blob_store_using_importlib_resources():
+    with _temporary_directory() as blob_store:
+        assert_script_output(
+            script_path="package_data/read_resources",
+            expected_output=b"Hello\n['farewell.txt', 'message.txt']\n",
+            package_data={"greetings": ["templates/*.txt"]},
+            import_mode="memory",
+            blob_store=blob_store,
+        )
+
+
+def test_blob_store_requires_memory_or_lazy_import_mode():
+    with _temporary_directory() as blob_store:
+        with pytest.raises(ValueError):
+            stickytape.script(find_script("single_file/hello"), blob_store=blob_store)
+
+
+def test_watcher_only_parses_changed_modules_when_rebuilding(monkeypatch):
+    parsed_paths = []
+    list_imports_in_module = stickytape._list_imports_in_module
+
+    def counting_list_imports_in_module(python_module, static_guards=None, source=None):
+        parsed_paths.append(python_module.absolute_path)
+        return list_imports_in_module(python_module, static_guards, source=source)
+
+    monkeypatch.setattr(stickytape, "_list_imports_in_module", counting_list_imports_in_module)
+
+    with _temporary_directory() as script_dir:
+        script_path = os.path.join(script_dir, "hello")
+        _write_source(script_path, "import greeting\nprint(greeting.message)\n")
+        _write_source(os.path.join(script_dir, "greeting.py"), "message = 'Hello'\n")
+        _write_source(os.path.join(script_dir, "unchanged.py"), "")
+        _write_source(os.path.join(script_dir, "script_helper.py"), "import unchanged\n")
+        output_path = os.path.join(script_dir, "output")
+
+        with stickytape.BundleWatcher(script_path, output_path) as watcher:
+            watcher.build()
+            assert watcher.rebuild_if_changed() == []
+            _assert_output_of_watched_script(output_path, b"Hello\n")
+
+            _write_source(script_path, "import greeting, script_helper\nprint(greeting.message)\n")
+            assert watcher.rebuild_if_changed() == [script_path]
+            _assert_output_of_watched_script(output_path, b"Hello\n")
+
+            del parsed_paths[:]
+            _write_source(os.path.join(script_dir, "greeting.py"), "from messages import message\n")
+            _write_source(os.path.join(script_dir, "messages.py"), "message = 'Hello again'\n")
+            watcher.rebuild_if_changed()
+            _assert_output_of_watched_script(output_path, b"Hello again\n")
+            assert sorted(parsed_paths) == [
+                os.path.join(script_dir, "greeting.py"),
+                os.path.join(script_dir, "messages.py"),
+            ]
+
+
+def test_watcher_keeps_previous_output_when_build_fails():
+    with _temporary_directory() as script_dir:
+        script_path = os.path.join(script_dir, "hello")
+        _write_source(script_path, "import greeting\nprint(greeting.message)\n")
+        _write_source(os.path.join(script_dir, "greeting.py"), "message = 'Hello'\n")
+        output_path = os.path.join(script_dir, "output")
+
+        with stickytape.BundleWatcher(script_path, output_path, import_mode="lazy") as watcher:
+            watcher.build()
+
+            _write_source(os.path.join(script_dir, "greeting.py"), "message = (\n")
+            with pytest.raises(SyntaxError):
+                watcher.rebuild_if_changed()
+            assert watcher.rebuild_if_changed() == []
+            _assert_output_of_watched_script(output_path, b"Hello\n")
+
+            _write_source(os.path.join(script_dir, "greeting.py"), "message = 'Hello again'\n")
+            watcher.rebuild_if_changed()
+            _assert_output_of_watched_script(output_path, b"Hello again\n")
+
+
+def test_minified_modules_have_docstrings_and_comments_removed():
+    for import_mode in ("tempdir", "memory", "lazy"):
+        result = stickytape.script(
+            find_script("module_with_docstrings_and_comments/hello"),
+            import_mode=import_mode,
+            minify=True,
+        )
+
+        assert "Greetings." not in result
+        assert "The greeting to use" not in result
+        assert "_greeting: str" in result
+        _assert_output_of_bundled_script(result, b"Hello, Bob # not a comment\nNone\n7\n")
+
+
+def test_minified_modules_can_preserve_line_numbers_and_strip_annotations():
+    report = stickytape.BundleReport()
+    result = stickytape.script(
+        find_script("module_with_docstrings_and_comments/hello"),
+        minify=True,
+        strip_annotations=True,
+        preserve_line_numbers=True,
+        precompile=True,
+        report=report,
+    )
+
+    assert "_greeting: str" not in result
+    assert "-> str" not in result
+    _assert_output_of_bundled_script(result, b"Hello, Bob # not a comment\nNone\n21\n")
+
+    module = report.modules[0]
+    assert module["minified_size"] < module["raw_size"]
+    assert report.to_json()["minification_saved"] == module["raw_size"] - module["minified_size"]
+
+
+def test_minifier_leaves_sources_that_cant_be_parsed_unchanged():
+    minifier = stickytape.Minifier()
+    source = b"# A Python 2 module\nprint 'Hello'\n"
+
+    assert minifier.minify(source) == source
+
+
+def test_minifier_strips_parenthesised_return_annotations():
+    for preserve_line_numbers in (False, True):
+        minifier = stickytape.Minifier(strip_annotations=True, preserve_line_numbers=preserve_line_numbers)
+        source = b"def g(a) -> (\n    int):\n    # Identity\n    return a\n"
+
+        result = minifier.minify(source)
+
+        assert b"int" not in result
+        assert b"Identity" not in result
+        assert _run_minified_source(result, "print(g(1))") == b"1\n"
+
+
+def test_minifier_strips_parenthesised_argument_annotations():
+    for preserve_line_numbers in (False, True):
+        minifier = stickytape.Minifier(strip_annotations=True, preserve_line_numbers=preserve_line_numbers)
+        source = b"def f(a: (int), b: (  # Name\n    str\n) = 'x'):\n    return (a, b)\n"
+
+        result = minifier.minify(source)
+
+        assert b"int" not in result
+        assert b"str" not in result
+        assert b"Name" not in result
+        assert _run_minified_source(result, "print(f(1))") == b"(1, 'x')\n"
+
+
+def test_cache_import_mode_extracts_bundle_once():
+    result = stickytape.script(find_script("duplicate_modules/hello"), import_mode="cache", precompile=True)
+
+    with _temporary_script(result) as output_path, _temporary_directory() as cache_dir:
+        env = dict(os.environ, STICKYTAPE_CACHE_DIR=cache_dir)
+        output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+        assert b"Hello\nHello\n" == output
+
+        [entry] = os.listdir(cache_dir)
+        with open(os.path.join(cache_dir, entry, "second", "greeting.py"), "w") as module_file:
+            module_file.write("message = 'Cached'\n")
+        os.remove(importlib.util.cache_from_source(os.path.join(cache_dir, entry, "second", "greeting.py")))
+
+        output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+        assert b"Hello\nCached\n" == output
+        assert os.listdir(cache_dir) == [entry]
+
+
+def test_cache_import_mode_writes_bytecode_into_entry_when_pycache_prefix_is_set():
+    result = stickytape.script(find_script("duplicate_modules/hello"), import_mode="cache", precompile=True)
+
+    with _temporary_script(result) as output_path, _temporary_directory() as cache_dir, _temporary_directory() as pycache_prefix:
+        env = dict(
+            os.environ,
+            STICKYTAPE_CACHE_DIR=cache_dir,
+            PYTHONPYCACHEPREFIX=os.path.join(pycache_prefix, "missing"),
+        )
+        output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+        assert b"Hello\nHello\n" == output
+
+        [entry] = os.listdir(cache_dir)
+        bytecode_name = "greeting.{0}.pyc".format(sys.implementation.cache_tag)
+        assert bytecode_name in os.listdir(os.path.join(cache_dir, entry, "second", "__pycache__"))
+
+def test_cache_import_mode_uses_separate_entries_for_different_bundles():
+    first_result = stickytape.script(find_script("duplicate_modules/hello"), import_mode="cache")
+    second_result = stickytape.script(find_script("duplicate_modules/hello_again"), import_mode="cache")
+
+    with _temporary_directory() as cache_dir:
+        env = dict(os.environ, STICKYTAPE_CACHE_DIR=cache_dir)
+        for result in (first_result, second_result):
+            with _temporary_script(result) as output_path:
+                subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True)
+
+        assert len(os.listdir(cache_dir)) == 2
+
+
+def test_cache_import_mode_uses_separate_entries_for_different_minification():
+    script_path = find_script("duplicate_modules/hello")
+    results = [
+        stickytape.script(script_path, import_mode="cache"),
+        stickytape.script(script_path, import_mode="cache", minify=True),
+        stickytape.script(script_path, import_mode="cache", minify=True, preserve_line_numbers=True),
+    ]
+
+    content_hashes = [
+        re.search(r"__stickytape_cache\.open\('([0-9a-f]+)'\)", result).group(1)
+        for result in results
+    ]
+    assert len(set(content_hashes)) == 3
+
+
+def test_cache_import_mode_reuses_sources_read_when_finding_imports():
+    script_path = find_script("duplicate_modules/hello")
+    report = stickytape.BundleReport()
+    stickytape.script(script_path, import_mode="cache", minify=True, report=report)
+
+    # Each file is read once to find its imports, and modules are read
+    # again as they're written, but not to hash the contents of the bundle.
+    assert report.bytes_read == os.path.getsize(script_path) + 2 * sum(
+        module["raw_size"]
+        for module in report.modules
+    )
+
+def test_cache_import_mode_evicts_unused_entries():
+    result = stickytape.script(find_script("duplicate_modules/hello"), import_mode="cache")
+
+    with _temporary_script(result) as output_path, _temporary_directory() as cache_dir:
+        old_time = time.time() - 60 * 24 * 60 * 60
+        for name in ("old-entry", ".tmp-interrupted", "recent-entry"):
+            os.mkdir(os.path.join(cache_dir, name))
+            if name != "recent-entry":
+                os.utime(os.path.join(cache_dir, name), (old_time, old_time))
+
+        env = dict(os.environ, STICKYTAPE_CACHE_DIR=cache_dir)
+        output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+        assert b"Hello\nHello\n" == output
+
+        entries = sorted(os.listdir(cache_dir))
+        assert "old-entry" not in entries
+        assert ".tmp-interrupted" not in entries
+        assert "recent-entry" in entries
+        assert len(entries) == 2
+
+
+def test_extension_modules_are_bundled_when_included():
+    with _temporary_extension_package() as script_path:
+        for import_mode in ("tempdir", "memory", "lazy", "cache"):
+            result = stickytape.script(script_path, import_mode=import_mode, include_extensions=True)
+            with _temporary_directory() as cache_dir:
+                env = dict(os.environ, STICKYTAPE_CACHE_DIR=cache_dir)
+                with _temporary_script(result) as output_path:
+                    output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+                assert b"1\n" == output
+
+
+def test_extension_modules_are_not_bundled_by_default():
+    with _temporary_extension_package() as script_path:
+        result = stickytape.script(script_path, import_mode="memory")
+        assert "extensions/_bisect" not in result
+        assert "__stickytape_add_extensions(" not in result
+
+
+def test_memory_import_mode_reuses_extension_modules_written_to_cache():
+    with _temporary_extension_package() as script_path:
+        result = stickytape.script(script_path, import_mode="lazy", compression="zlib", include_extensions=True)
+
+        with _temporary_script(result) as output_path, _temporary_directory() as cache_dir:
+            env = dict(os.environ, STICKYTAPE_CACHE_DIR=cache_dir)
+            subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True)
+            [entry] = os.listdir(cache_dir)
+            [extension_name] = os.listdir(os.path.join(cache_dir, entry))
+            extension_path = os.path.join(cache_dir, entry, extension_name)
+            assert extension_name.startswith("_bisect.")
+            old_time = time.time() - 60 * 60
+            os.utime(extension_path, (old_time, old_time))
+
+            output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+            assert b"1\n" == output
+            assert os.path.getmtime(extension_path) == old_time
+
+
+def test_extension_modules_are_loaded_from_blob_store():
+    with _temporary_extension_package() as script_path, _temporary_directory() as blob_store:
+        result = stickytape.script(script_path, import_mode="memory", blob_store=blob_store, include_extensions=True)
+
+        with _temporary_script(result) as output_path, _temporary_directory() as cache_dir:
+            env = dict(os.environ, STICKYTAPE_CACHE_DIR=cache_dir)
+            output = subprocess.run([sys.executable, output_path], env=env, stdout=subprocess.PIPE, check=True).stdout
+            assert b"1\n" == output
+            assert os.listdir(cache_dir) == []
+
+
+def test_zipapps_cannot_include_extension_modules():
+    with _temporary_directory() as output_dir:
+        with pytest.raises(ValueError):
+            stickytape.scripts([find_script("single_file/hello")], output_dir, output_format="zipapp", include_extensions=True)
+
+
+def test_module_resolver_finds_extension_modules_before_sources():
+    with _temporary_directory() as sys_path:
+        for name in ("fast.so", "fast.py", "slow.py"):
+            open(os.path.join(sys_path, name), "w").close()
+
+        resolver = stickytape.ModuleResolver([sys_path], extension_suffixes=(".abi3.so", ".so"))
+        fast = resolver.find_module("fast")
+        assert fast.relative_path == "fast.so"
+        assert fast.is_extension
+        assert not resolver.find_module("slow").is_extension
+        assert stickytape.ModuleResolver([sys_path]).find_module("fast").relative_path == "fast.py"
+
+
+def test_imports_are_found_in_the_same_order_as_ast_walk():
+    source = (
+        "import a\n"
+        "def f():\n"
+        "    import b\n"
+        "    try:\n"
+        "        import c\n"
+        "    except ImportError:\n"
+        "        from . import d\n"
+        "    finally:\n"
+        "        import e\n"
+        "class C(object):\n"
+        "    x = [lambda: 1]\n"
+        "    import f\n"
+        "if True:\n"
+        "    with open(x) as y:\n"
+        "        from .g import h\n"
+        "import i\n"
+    )
+    with _temporary_directory() as dir_path:
+        path = os.path.join(dir_path, "module.py")
+        with open(path, "w") as module_file:
+            module_file.write(source)
+
+        import_target = stickytape.ImportTarget(path, "package/module.py", is_package=False, module_name="package.module")
+        import_lines = stickytape._list_imports_in_module(import_target)
+
+    # Breadth-first, so imports nested more deeply are found later
+    assert [import_line.module_name for import_line in import_lines] == [
+        "a", "i", "b", "f", "c", "e", "package.g", "package",
+    ]
+
+
+def test_bundle_report_includes_bytes_read_when_reading_on_io_threads():
+    script_path = find_script("script_with_static_guards/hello")
+    results = []
+    for io_threads in (0, 4):
+        report = stickytape.BundleReport()
+        results.append(stickytape.script(script_path, io_threads=io_threads, report=report))
+
+        # Each file is read once to find its imports, and modules are read
+        # again as they're written.
+        assert report.bytes_read == os.path.getsize(script_path) + 2 * sum(
+            module["raw_size"]
+            for module in report.modules
+        )
+        assert report.to_json()["io_wait_time"] >= 0
+
+    assert results[0] == results[1]
+
+
+def test_interpreter_probe_is_cached_when_using_dependency_cache(monkeypatch):
+    probed_binaries = []
+    check_output = subprocess.check_output
+
+    def counting_check_output(args, *other_args, **kwargs):
+        probed_binaries.append(args[0])
+        return check_output(args, *other_args, **kwargs)
+
+    monkeypatch.setattr(stickytape.interpreter.subprocess, "check_output", counting_check_output)
+
+    with _temporary_directory() as cache_dir:
+        results = [
+            stickytape.script(find_script("single_file/hello"), python_binary=sys.executable, cache_dir=cache_dir)
+            for _ in range(2)
+        ]
+
+    assert probed_binaries == [sys.executable]
+    assert results[0] == results[1]
+
+
+def test_interpreter_cache_is_invalidated_when_virtualenv_or_pth_files_change():
+    with _temporary_directory() as root:
+        os.makedirs(os.path.join(root, "venv", "bin"))
+        python_binary = os.path.join(root, "venv", "bin", "python")
+        os.symlink(sys.executable, python_binary)
+        site_packages = os.path.join(root, "site-packages")
+        os.mkdir(site_packages)
+        _write_source(os.path.join(site_packages, "extra.pth"), "/extra\n")
+
+        cache = stickytape.InterpreterCache(os.path.join(root, "cache"))
+        info = {"sys_path": [site_packages]}
+        assert cache.read_interpreter_info(python_binary, "probe") is None
+        cache.write_interpreter_info(python_binary, "probe", info)
+        assert cache.read_interpreter_info(python_binary, "probe") == info
+        assert cache.read_interpreter_info(python_binary, "other probe") is None
+
+        _write_source(os.path.join(site_packages, "extra.pth"), "/other\n")
+        assert cache.read_interpreter_info(python_binary, "probe") is None
+        cache.write_interpreter_info(python_binary, "probe", info)
+        assert cache.read_interpreter_info(python_binary, "probe") == info
+
+        _write_source(os.path.join(root, "venv", "pyvenv.cfg"), "home = /usr/bin\n")
+        assert cache.read_interpreter_info(python_binary, "probe") is None
+
+
+def test_interpreter_cache_is_keyed_by_resolved_binary_and_virtualenv(monkeypatch):
+    with _temporary_directory() as root:
+        python_binaries = []
+        for name in ("first", "second"):
+            os.makedirs(os.path.join(root, name, "bin"))
+            python_binary = os.path.join(root, name, "bin", "python")
+            os.symlink(sys.executable, python_binary)
+            python_binaries.append(python_binary)
+
+        cache = stickytape.InterpreterCache(os.path.join(root, "cache"))
+        info = {"sys_path": []}
+        cache.write_interpreter_info(python_binaries[0], "probe", info)
+        assert cache.read_interpreter_info(python_binaries[1], "probe") is None
+
+        monkeypatch.setenv("PATH", os.path.join(root, "first", "bin"))
+        monkeypatch.chdir(root)
+        assert cache.read_interpreter_info("python", "probe") == info
+
+def test_interpreter_probe_only_reads_optional_fields_when_requested():
+    info = stickytape.interpreter.read_interpreter_info(sys.executable)
+    assert info.extension_suffixes == ()
+    assert info.stdlib_module_names is None
+
+    info = stickytape.interpreter.read_interpreter_info(
+        sys.executable,
+        fields=["extension_suffixes", "stdlib_module_names"],
+    )
+    assert info.extension_suffixes == tuple(importlib.machinery.EXTENSION_SUFFIXES)
+    assert "json" in info.stdlib_module_names
+
+def test_deterministic_output_does_not_depend_on_import_order():
+    with _temporary_directory() as script_dir:
+        _write_source(os.path.join(script_dir, "first.py"), "import third\n")
+        _write_source(os.path.join(script_dir, "second.py"), "message = 'Hello'\n")
+        _write_source(os.path.join(script_dir, "third.py"), "")
+        for name, imports in (("forwards", "first, second"), ("backwards", "second, first")):
+            _write_source(os.path.join(script_dir, name), "import {0}\nprint(second.message)\n".format(imports))
+
+        def bundle(name, **kwargs):
+            result = stickytape.script(os.path.join(script_dir, name), import_mode="lazy", **kwargs)
+            return result.replace("import second, first", "import first, second")
+
+        assert bundle("forwards") != bundle("backwards")
+        forwards = bundle("forwards", deterministic=True)
+        backwards = bundle("backwards", deterministic=True)
+        assert forwards.rpartition("\n# stickytape-manifest: ")[0] == backwards.rpartition("\n# stickytape-manifest: ")[0]
+        _assert_output_of_bundled_script(forwards, b"Hello\n")
+
+
+def test_deterministic_output_includes_manifest_of_file_hashes():
+    script_path = find_script("script_with_single_local_import/hello")
+    greeting_path = os.path.join(os.path.dirname(script_path), "greeting.py")
+    with open(greeting_path, "rb") as greeting_file:
+        greeting_hash = hashlib.sha256(greeting_file.read()).hexdigest()
+
+    result = stickytape.script(script_path, deterministic=True)
+    with _temporary_script(result) as output_path:
+        manifest = stickytape.read_manifest(output_path)
+    assert manifest["files"] == {"greeting.py": greeting_hash}
+    content = result.rpartition("\n# stickytape-manifest: ")[0]
+    assert manifest["content_hash"] == hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    with _temporary_directory() as output_dir:
+        [output_path] = stickytape.scripts([script_path], output_dir, output_format="zipapp", deterministic=True)
+        zipapp_manifest = stickytape.read_manifest(output_path)
+    assert zipapp_manifest["files"] == {"greeting.py": greeting_hash}
+    assert zipapp_manifest["script"] == manifest["script"]
+
+    with _temporary_script(stickytape.script(script_path)) as output_path:
+        assert stickytape.read_manifest(output_path) is None
+
+
 def _find_site_packages(root):
     paths = []
 
@@ -246,6 +1537,15 @@ def assert_script_output(script_path, expected_output, expected_modules=None, **
         actual_modules = set(re.findall(r"__stickytape_write_module\('([^']*)\.py'", result))
         assert set(expected_modules) == actual_modules
 
+    _assert_output_of_bundled_script(result, expected_output)
+
+
+def assert_zipapp_output(script_path, expected_output, **kwargs):
+    result = stickytape.zipapp(find_script(script_path), **kwargs)
+    _assert_output_of_bundled_script(result, expected_output)
+
+
+def _assert_output_of_bundled_script(result, expected_output):
     with _temporary_script(result) as script_file_path:
         try:
             if _is_windows():
@@ -261,6 +1561,44 @@ def assert_script_output(script_path, expected_output, expected_modules=None, **
         assert expected_output == output
 
 
+def _assert_output_of_watched_script(output_path, expected_output):
+    output = subprocess.run([sys.executable, output_path], stdout=subprocess.PIPE, check=True).stdout
+    assert expected_output == output
+
+
+def _write_source(path, source):
+    # Changes the mtime even if the file was written within the filesystem's
+    # timestamp granularity.
+    previous_mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    with open(path, "w") as source_file:
+        source_file.write(source)
+    mtime = max(os.stat(path).st_mtime_ns, previous_mtime + 1000000000)
+    os.utime(path, ns=(mtime, mtime))
+
+
+@contextlib.contextmanager
+def _temporary_extension_package():
+    # Copies an extension module from the standard library into a package,
+    # and yields the path of a script that uses it.
+    spec = importlib.util.find_spec("_bisect")
+    if spec.origin is None or not spec.origin.endswith(tuple(importlib.machinery.EXTENSION_SUFFIXES)):
+        pytest.skip("_bisect isn't an extension module")
+
+    with _temporary_directory() as dir_path:
+        os.mkdir(os.path.join(dir_path, "extensions"))
+        open(os.path.join(dir_path, "extensions", "__init__.py"), "w").close()
+        shutil.copy(spec.origin, os.path.join(dir_path, "extensions"))
+        script_path = os.path.join(dir_path, "hello")
+        with open(script_path, "w") as script_file:
+            script_file.write("from extensions import _bisect\nprint(_bisect.bisect_left([1, 2, 3], 2))\n")
+        yield script_path
+
+
+def _run_minified_source(source, statement):
+    program = source.decode("utf-8") + statement + "\n"
+    return subprocess.run([sys.executable, "-c", program], stdout=subprocess.PIPE, check=True).stdout
+
+
 def find_script(path):
     return os.path.join(test_script_root, path)
 
@@ -268,7 +1606,7 @@ def find_script(path):
 def _temporary_script(contents):
     with _temporary_directory() as dir_path:
         path = os.path.join(dir_path, "script")
-        with open(path, "w") as script_file:
+        with open(path, "wb" if isinstance(contents, bytes) else "w") as script_file:
             script_file.write(contents)
 
         subprocess.run(["chmod", "+x", path])